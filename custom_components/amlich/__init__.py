@@ -1,8 +1,9 @@
+import importlib
 import os
 import voluptuous as vol
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, SupportsResponse
 from homeassistant.const import CONF_PATH
-from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import config_validation as cv, discovery
 from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
 import logging
 import traceback
@@ -16,6 +17,8 @@ CONFIG_SCHEMA = vol.Schema({
     vol.Required(DOMAIN): vol.Schema({
         vol.Required(CONF_PATH): cv.string,
         vol.Optional('api_key', default=""): cv.string,
+        # Số lệnh gọi Gemini đồng thời tối đa, dùng chung cho mọi kênh tra cứu
+        vol.Optional('gemini_max_concurrency', default=4): vol.All(vol.Coerce(int), vol.Range(min=1)),
     })
 }, extra=vol.ALLOW_EXTRA)
 
@@ -31,7 +34,7 @@ async def async_setup(hass: HomeAssistant, config: dict) -> bool:
         conf = config[DOMAIN]
         ics_path = conf.get(CONF_PATH)
         api_key = conf.get('api_key')
-        _LOGGER.debug(f"Cấu hình: ics_path={ics_path}, api_key={'****' if api_key else 'None'}")
+        _LOGGER.debug("Cấu hình: ics_path=%s, api_key=%s", ics_path, '****' if api_key else 'None')
 
         # Kiểm tra đường dẫn ICS
         if not ics_path:
@@ -42,21 +45,21 @@ async def async_setup(hass: HomeAssistant, config: dict) -> bool:
         def check_file():
             try:
                 if not os.path.exists(ics_path):
-                    _LOGGER.error(f"File ICS không tồn tại: {ics_path}")
+                    _LOGGER.error("File ICS không tồn tại: %s", ics_path)
                     return False
                 if not os.path.isfile(ics_path):
-                    _LOGGER.error(f"Đường dẫn ICS không phải file: {ics_path}")
+                    _LOGGER.error("Đường dẫn ICS không phải file: %s", ics_path)
                     return False
                 with open(ics_path, 'r', encoding='utf-8') as f:
                     content = f.read(1024)
                     if not content.strip():
-                        _LOGGER.error(f"File ICS rỗng: {ics_path}")
+                        _LOGGER.error("File ICS rỗng: %s", ics_path)
                         return False
                 size = os.path.getsize(ics_path)
-                _LOGGER.debug(f"File ICS {ics_path} có thể đọc, kích thước: {size} bytes")
+                _LOGGER.debug("File ICS %s có thể đọc, kích thước: %s bytes", ics_path, size)
                 return True
             except Exception as e:
-                _LOGGER.error(f"Lỗi khi kiểm tra file ICS {ics_path}: {str(e)}")
+                _LOGGER.error("Lỗi khi kiểm tra file ICS %s: %s", ics_path, e)
                 return False
 
         if not await hass.async_add_executor_job(check_file):
@@ -67,68 +70,117 @@ async def async_setup(hass: HomeAssistant, config: dict) -> bool:
         hass.data[DOMAIN] = {'ics_path': ics_path, 'api_key': api_key}
         _LOGGER.debug("Đã lưu cấu hình vào hass.data")
 
-        # Kiểm tra import amlich_core
+        # Import amlich_core trong executor để không chặn event loop
         try:
-            from .amlich_core import load_ics_file, set_api_key
+            core = await hass.async_add_executor_job(importlib.import_module, f"{__name__}.amlich_core")
         except ImportError as e:
-            _LOGGER.error(f"Lỗi import amlich_core: {str(e)}")
+            _LOGGER.error("Lỗi import amlich_core: %s", e)
             return False
 
         # Đặt API key
         try:
-            await hass.async_add_executor_job(set_api_key, api_key)
+            await hass.async_add_executor_job(core.set_api_key, api_key, conf['gemini_max_concurrency'])
             _LOGGER.debug("Đã đặt API key")
         except Exception as e:
-            _LOGGER.error(f"Lỗi khi đặt API key: {str(e)}")
+            _LOGGER.error("Lỗi khi đặt API key: %s", e)
             return False
 
+        # Tải cache kết quả Gemini (không bắt buộc)
+        try:
+            await core.async_setup_gemini_cache(hass)
+            _LOGGER.debug("Đã tải cache Gemini")
+        except Exception as e:
+            _LOGGER.warning("Không thể tải cache Gemini: %s", e)
+
         # Tải file ICS
         try:
-            if not await hass.async_add_executor_job(load_ics_file, ics_path):
+            if not await hass.async_add_executor_job(core.load_ics_file, ics_path):
                 _LOGGER.error("Không thể tải file ICS")
                 return False
             _LOGGER.debug("Đã tải file ICS thành công")
         except Exception as e:
-            _LOGGER.error(f"Lỗi khi tải file ICS: {str(e)}")
+            _LOGGER.error("Lỗi khi tải file ICS: %s", e)
             return False
 
-        # Kích hoạt platform sensor
+        # Kích hoạt platform calendar (sensor được khai báo trong mục sensor: của configuration.yaml)
         try:
             hass.async_create_task(
-                hass.config_entries.async_forward_entry_setup(
-                    config[DOMAIN], "sensor"
-                )
+                discovery.async_load_platform(hass, "calendar", DOMAIN, {}, config)
             )
-            _LOGGER.debug("Đã yêu cầu thiết lập platform sensor")
+            _LOGGER.debug("Đã yêu cầu thiết lập platform calendar")
         except Exception as e:
-            _LOGGER.error(f"Lỗi khi thiết lập platform sensor: {str(e)}")
+            _LOGGER.error("Lỗi khi thiết lập platform calendar: %s", e)
             return False
 
         # Đăng ký service reload_ics
         async def reload_ics_service(call):
             _LOGGER.debug("Gọi service reload_ics")
             try:
-                if not await hass.async_add_executor_job(load_ics_file, ics_path):
+                changes = await hass.async_add_executor_job(core.reload_ics_file, ics_path)
+                if changes is None:
                     _LOGGER.error("Không thể làm mới dữ liệu ICS")
                     return
-                _LOGGER.debug("Đã làm mới dữ liệu ICS")
-                sensor_entity_id = "sensor.tra_cuu_su_kien"
-                if sensor_entity_id in hass.states.async_entity_ids():
-                    await hass.helpers.entity_component.async_update_entity(sensor_entity_id)
-                    _LOGGER.debug(f"Đã cập nhật sensor {sensor_entity_id}")
-                else:
-                    _LOGGER.warning(f"Sensor {sensor_entity_id} chưa được khởi tạo")
+                summary = {kind: len(records) for kind, records in changes.items()}
+                _LOGGER.info("Đã làm mới dữ liệu ICS: %s", summary)
+                hass.bus.async_fire(f"{DOMAIN}_ics_reloaded", {
+                    kind: [{'date': start_date.strftime('%Y-%m-%d'), 'end': end_date.strftime('%Y-%m-%d'),
+                            'summary': text}
+                           for _, _, start_date, text, end_date in records]
+                    for kind, records in changes.items()
+                })
+                # Các sensor tra cứu và lịch tự cập nhật khi nhận sự kiện trên
             except Exception as e:
-                _LOGGER.error(f"Lỗi khi thực thi reload_ics: {str(e)}")
+                _LOGGER.error("Lỗi khi thực thi reload_ics: %s", e)
                 raise
 
         hass.services.async_register(DOMAIN, "reload_ics", reload_ics_service)
         _LOGGER.debug("Đã đăng ký service reload_ics")
 
+        # Đăng ký service query: tra cứu một câu và trả kết quả ngay cho người gọi,
+        # không cần ghi input_text rồi chờ sensor đổi trạng thái
+        async def query_service(call):
+            query = call.data['query']
+            use_humor = call.data.get('use_humor')
+            if use_humor is None:
+                use_humor = hass.states.is_state("input_boolean.use_humor", "on")
+            _LOGGER.debug("Gọi service query: %s, use_humor=%s", query, use_humor)
+            return {'query': query, **await core.query_date(hass, query, use_humor=use_humor)}
+
+        hass.services.async_register(
+            DOMAIN, "query", query_service,
+            schema=vol.Schema({
+                vol.Required('query'): cv.string,
+                vol.Optional('use_humor'): cv.boolean,
+            }),
+            supports_response=SupportsResponse.ONLY,
+        )
+        _LOGGER.debug("Đã đăng ký service query")
+
+        # Đăng ký service query_batch: tra cứu nhiều câu/ngày, trả kết quả theo thứ tự
+        async def query_batch_service(call):
+            queries = call.data['queries']
+            _LOGGER.debug("Gọi service query_batch với %s truy vấn", len(queries))
+            results = await core.query_dates_batch(hass, queries, call.data['use_humor'])
+            return {'results': [{'query': str(query), **result} for query, result in zip(queries, results)]}
+
+        hass.services.async_register(
+            DOMAIN, "query_batch", query_batch_service,
+            schema=vol.Schema({
+                vol.Required('queries'): vol.All(cv.ensure_list, [vol.Any(cv.date, cv.string)]),
+                vol.Optional('use_humor', default=False): cv.boolean,
+            }),
+            supports_response=SupportsResponse.ONLY,
+        )
+        _LOGGER.debug("Đã đăng ký service query_batch")
+
+        # Mẫu câu hội thoại gọi thẳng intent tra cứu (không qua input_text/sensor/automation)
+        from .intent import async_register_sentences
+        async_register_sentences(hass)
+
         _LOGGER.info("Thiết lập component amlich thành công")
         return True
 
     except Exception as e:
-        _LOGGER.error(f"Lỗi nghiêm trọng khi thiết lập amlich: {str(e)}")
-        _LOGGER.error(f"Traceback: {traceback.format_exc()}")
+        _LOGGER.error("Lỗi nghiêm trọng khi thiết lập amlich: %s", e)
+        _LOGGER.error("Traceback: %s", traceback.format_exc())
         return False
\ No newline at end of file
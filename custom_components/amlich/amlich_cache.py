@@ -0,0 +1,189 @@
+"""Cache LRU có thời hạn cho kết quả Gemini.
+
+Kết quả sửa chính tả không phụ thuộc ngày nên được giữ lâu; kết quả phân tích
+ngày tương đối ('tuần này', 'ngày mai'...) và kết quả sửa chính tả kèm phân
+tích trong một lần gọi chỉ đúng trong ngày hiện tại nên hết hạn lúc nửa đêm
+theo giờ địa phương. Ba loại này được lưu vào .storage của Home Assistant.
+Câu trả lời hài hước chỉ được giữ trong bộ nhớ, mỗi câu gốc có nhiều biến thể
+được trả lần lượt.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = "amlich_gemini_cache"
+STORAGE_VERSION = 1
+SAVE_DELAY = 30
+
+SPELLING_TTL = 30 * 24 * 3600
+SPELLING_MAX_SIZE = 500
+PARSE_MAX_SIZE = 200
+QUERY_MAX_SIZE = 200
+
+HUMOR_TTL = 24 * 3600
+HUMOR_MAX_SIZE = 200
+HUMOR_MAX_VARIANTS = 3
+
+
+def normalize_key(text):
+    return ' '.join(text.lower().split())
+
+
+def end_of_local_day():
+    """Thời điểm (timestamp) nửa đêm tới theo giờ địa phương."""
+    return (dt_util.start_of_local_day() + timedelta(days=1)).timestamp()
+
+
+class LruTtlCache:
+    """Cache giới hạn số phần tử, loại phần tử ít dùng nhất, mỗi phần tử có hạn dùng riêng."""
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now=None):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= (now or time.time()):
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def dump(self, now=None):
+        now = now or time.time()
+        return [[key, value, expires_at] for key, (value, expires_at) in self._entries.items() if expires_at > now]
+
+    def restore(self, entries, now=None):
+        now = now or time.time()
+        for key, value, expires_at in entries:
+            if expires_at > now:
+                self.set(key, value, expires_at)
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class GeminiCache:
+    """Cache sửa chính tả và phân tích ngày của Gemini, lưu qua các lần khởi động lại."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.spelling = LruTtlCache(SPELLING_MAX_SIZE)
+        self.parses = LruTtlCache(PARSE_MAX_SIZE)
+        self.queries = LruTtlCache(QUERY_MAX_SIZE)
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+
+    async def async_load(self):
+        try:
+            data = await self._store.async_load()
+        except Exception as e:
+            _LOGGER.warning("Không đọc được cache Gemini: %s", e)
+            return
+        if data:
+            self.spelling.restore(data.get('spelling', []))
+            self.parses.restore(data.get('parses', []))
+            self.queries.restore(data.get('queries', []))
+        _LOGGER.debug("Đã tải cache Gemini: %s câu sửa chính tả, %s kết quả phân tích, %s câu tra cứu",
+                      len(self.spelling), len(self.parses), len(self.queries))
+
+    def get_spelling(self, text):
+        return self.spelling.get(normalize_key(text))
+
+    def set_spelling(self, text, fixed_text):
+        self.spelling.set(normalize_key(text), fixed_text, time.time() + SPELLING_TTL)
+        self._schedule_save()
+
+    def get_parse(self, text):
+        return self.parses.get(normalize_key(text))
+
+    def set_parse(self, text, result):
+        self.parses.set(normalize_key(text), result, end_of_local_day())
+        self._schedule_save()
+
+    def get_query(self, text):
+        return self.queries.get(normalize_key(text))
+
+    def set_query(self, text, result):
+        self.queries.set(normalize_key(text), result, end_of_local_day())
+        self._schedule_save()
+
+    def stats(self):
+        return {'spelling': self.spelling.stats(), 'parses': self.parses.stats(), 'queries': self.queries.stats()}
+
+    def _schedule_save(self):
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def _data_to_save(self):
+        return {'spelling': self.spelling.dump(), 'parses': self.parses.dump(), 'queries': self.queries.dump()}
+
+
+class HumorCache:
+    """Các biến thể hài hước của mỗi câu gốc, trả lần lượt để câu trả lời không bị lặp.
+
+    get() luôn trả ngay biến thể có sẵn (kể cả khi đã cũ) kèm cờ cho biết có nên
+    gọi Gemini ngầm để lấy thêm biến thể mới hay không.
+    """
+
+    def __init__(self, max_size=HUMOR_MAX_SIZE, max_variants=HUMOR_MAX_VARIANTS, ttl=HUMOR_TTL):
+        self._max_size = max_size
+        self._max_variants = max_variants
+        self._ttl = ttl
+        # câu gốc → [danh sách biến thể, vị trí biến thể tiếp theo, thời điểm thêm biến thể mới nhất]
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, original, now=None):
+        """Trả về (biến thể, cần làm mới) hoặc None nếu chưa có biến thể nào."""
+        entry = self._entries.get(original)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(original)
+        self.hits += 1
+        variants, index, updated_at = entry
+        entry[1] = (index + 1) % len(variants)
+        stale = updated_at + self._ttl <= (now or time.time())
+        return variants[index % len(variants)], stale or len(variants) < self._max_variants
+
+    def add(self, original, variant, now=None):
+        now = now or time.time()
+        entry = self._entries.get(original)
+        if entry is None:
+            self._entries[original] = [[variant], 0, now]
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+            return
+        variants = entry[0]
+        if variant not in variants:
+            variants.append(variant)
+            if len(variants) > self._max_variants:
+                variants.pop(0)
+        entry[2] = now
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -1,167 +1,349 @@
+import asyncio
 import re
 import json
-import requests
-from datetime import datetime, timedelta
-from dateutil.parser import parse
-from icalendar import Calendar
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import hashlib
+import importlib
 import logging
 import os
+import time
 from homeassistant.core import HomeAssistant
+from .amlich_cache import GeminiCache, HumorCache
+from .amlich_fuzzy import correct_query, fold
+from .amlich_gemini import DEFAULT_MAX_CONCURRENCY, GeminiError
+from .amlich_index import EventIndex, SearchIndex
+from .amlich_lunar import LunarDayTable, solar_to_lunar, lunar_to_solar
+from .amlich_stats import QueryStats
+from .amlich_trace import NULL_TRACE, start_trace
+
+# Phần tra cứu (tính âm lịch, chỉ mục, cú pháp ngày) chỉ cần các import ở trên.
+# Bộ đọc ICS/snapshot được import khi tải file (trong executor), client Gemini và
+# aiohttp khi đặt API key (set_api_key cũng chạy trong executor), nên không có
+# import nặng nào chạy trên event loop.
 
 _LOGGER = logging.getLogger(__name__)
 
 GEMINI_API_KEY = None
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+_gemini_client = None
+_gemini_max_concurrency = DEFAULT_MAX_CONCURRENCY
+_gemini_cache = None
+# Câu trả lời hài hước chỉ giữ trong bộ nhớ, cùng các câu gốc đang được làm mới ngầm
+_humor_cache = HumorCache()
+_humor_refreshing = set()
+# Độ trễ từng giai đoạn và đường xử lý của các lần query_date
+_query_stats = QueryStats()
 
-def set_api_key(api_key):
-    global GEMINI_API_KEY
+def set_api_key(api_key, max_concurrency=None):
+    """Đặt API key và số lệnh gọi Gemini đồng thời tối đa (dùng chung cho mọi truy vấn)."""
+    global GEMINI_API_KEY, _gemini_client, _gemini_max_concurrency
+    if api_key:
+        _import_gemini_client()
     GEMINI_API_KEY = api_key
-    _LOGGER.debug(f"Đã đặt Gemini API key: {'***' if api_key else 'None'}")
+    if max_concurrency:
+        _gemini_max_concurrency = max_concurrency
+    _gemini_client = None
+    _LOGGER.debug("Đã đặt Gemini API key: %s", '***' if api_key else 'None')
+
+def _import_gemini_client():
+    """Import client Gemini cùng aiohttp, gọi từ executor trước khi cần đến."""
+    importlib.import_module('homeassistant.helpers.aiohttp_client')
+    importlib.import_module('aiohttp')
+
+def get_gemini_client(hass: HomeAssistant):
+    """GeminiClient dùng chung, tạo lần đầu trên session aiohttp của Home Assistant."""
+    global _gemini_client
+    if _gemini_client is None:
+        from homeassistant.helpers.aiohttp_client import async_get_clientsession
+        from .amlich_gemini import GeminiClient
+
+        _gemini_client = GeminiClient(async_get_clientsession(hass), GEMINI_API_KEY,
+                                      max_concurrency=_gemini_max_concurrency)
+    return _gemini_client
+
+async def async_setup_gemini_cache(hass: HomeAssistant):
+    """Tải cache kết quả Gemini từ .storage."""
+    global _gemini_cache
+    cache = GeminiCache(hass)
+    await cache.async_load()
+    _gemini_cache = cache
+    return cache
+
+def get_gemini_cache_stats():
+    stats = _gemini_cache.stats() if _gemini_cache else {}
+    stats['humor'] = _humor_cache.stats()
+    return stats
+
+def get_diagnostics():
+    """Thống kê độ trễ truy vấn, số lần gọi Gemini và cache, dùng cho sensor chẩn đoán."""
+    data = _data
+    return {
+        'calendar': {'events': len(data.records), 'event_names': len(data.search),
+                     'lunar_table': data.day_table is not None},
+        'queries': _query_stats.summary(),
+        'gemini': _gemini_client.stats() if _gemini_client else {},
+        'cache': get_gemini_cache_stats()
+    }
+
+# Bảng âm lịch gọn theo ordinal, ngoài khoảng năm này sẽ tính trực tiếp
+DAY_TABLE_START_YEAR = 1900
+DAY_TABLE_END_YEAR = 2100
+
+# Ảnh chụp dữ liệu lịch, không bao giờ bị sửa sau khi công bố:
+# - events: ngày dương lịch → danh sách sự kiện (ngày âm lịch được tính bằng amlich_lunar)
+# - records: khóa VEVENT (UID) → (SEQUENCE, mã băm nội dung, ngày, summary, ngày kết thúc) để tải lại từng phần
+# - day_table: LunarDayTable, None nếu chưa lập
+# - index: EventIndex dựng từ events/records cho truy vấn theo ngày và khoảng thời gian
+# - search: SearchIndex dựng từ records để tìm sự kiện theo tên ('khi nào tết trung thu')
+# Mỗi lần tải dựng một CalendarData mới rồi gán lại _data một lần duy nhất, truy vấn
+# lấy _data một lần khi bắt đầu nên không bao giờ thấy dữ liệu đang dựng dở.
+CalendarData = namedtuple('CalendarData', ['events', 'records', 'day_table', 'index', 'search'])
+_data = CalendarData({}, {}, None, EventIndex({}, {}), SearchIndex({}))
+# Chỉ tuần tự hóa các lần tải, truy vấn không cần khóa
+_load_lock = threading.Lock()
+
+_LUNAR_SUMMARY = re.compile(r'^\d{1,2}/\d{1,2}(?:\s*\(N\))?$')
+
+def _content_hash(start_date, summary, end_date):
+    content = f"{start_date.isoformat()}\x1f{summary}"
+    if end_date != start_date:
+        content += f"\x1f{end_date.isoformat()}"
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=8).hexdigest()
+
+def _collect_records(ics_events):
+    records = {}
+    skipped_lunar = 0
+    debug = _LOGGER.isEnabledFor(logging.DEBUG)
+    for event in ics_events:
+        if debug:
+            _LOGGER.debug("Processing event: DTSTART=%s, SUMMARY=%s", event.start, event.summary)
+        if _LUNAR_SUMMARY.match(event.summary):
+            # File ICS cũ có một VEVENT "DD/MM" cho mỗi ngày, bỏ qua vì đã tính được
+            skipped_lunar += 1
+            continue
+        end_date = event.end or event.start
+        content_hash = _content_hash(event.start, event.summary, end_date)
+        key = event.uid or f"hash:{content_hash}"
+        # UID trùng (hoặc VEVENT không có UID giống hệt nhau) được đánh số thêm
+        base_key, count = key, 1
+        while key in records:
+            count += 1
+            key = f"{base_key}#{count}"
+        records[key] = (event.sequence, content_hash, event.start, event.summary, end_date)
+    return records, skipped_lunar
+
+def _read_records(file_path):
+    from .amlich_ics import UnsupportedIcsError, iter_events, iter_events_icalendar
+
+    try:
+        return _collect_records(iter_events(file_path))
+    except UnsupportedIcsError as e:
+        _LOGGER.info("Bộ đọc ICS tuần tự không hỗ trợ file này (%s), chuyển sang icalendar", e)
+        return _collect_records(iter_events_icalendar(file_path))
+
+def _build_events(records):
+    events = {}
+    debug = _LOGGER.isEnabledFor(logging.DEBUG)
+    for _, _, start_date, summary, _ in records.values():
+        if start_date not in events:
+            events[start_date] = []
+        events[start_date].append(summary)
+        if debug:
+            _LOGGER.debug("Added event for %s: %s", start_date, summary)
+    return events
+
+def _patch_events(events, old_records, new_records):
+    """Áp dụng thay đổi giữa hai lần tải lên bản sao của events.
 
-_lunar_dates = {}
-_solar_dates = {}
-_events = {}
+    Chỉ các danh sách sự kiện của ngày bị thay đổi được sao chép, bản events
+    đang dùng không bị sửa nên các truy vấn đang chạy vẫn thấy dữ liệu cũ.
+    """
+    added = [key for key in new_records if key not in old_records]
+    removed = [key for key in old_records if key not in new_records]
+    modified = [key for key in new_records
+                if key in old_records and new_records[key][:2] != old_records[key][:2]]
+    patched = dict(events)
+    for key in removed + modified:
+        _, _, start_date, summary, _ = old_records[key]
+        remaining = list(patched.get(start_date, []))
+        if summary in remaining:
+            remaining.remove(summary)
+        if remaining:
+            patched[start_date] = remaining
+        else:
+            patched.pop(start_date, None)
+    for key in added + modified:
+        _, _, start_date, summary, _ = new_records[key]
+        patched[start_date] = patched.get(start_date, []) + [summary]
+    changes = {
+        'added': [new_records[key] for key in added],
+        'removed': [old_records[key] for key in removed],
+        'modified': [new_records[key] for key in modified]
+    }
+    return patched, changes
+
+def get_calendar_data():
+    """Ảnh chụp dữ liệu lịch hiện tại."""
+    return _data
 
 def load_ics_file(file_path):
-    global _lunar_dates, _solar_dates, _events
-    _lunar_dates = {}
-    _solar_dates = {}
-    _events = {}
-    _LOGGER.debug(f"Đang tải file ICS từ: {file_path}")
+    with _load_lock:
+        return _load_ics_file(file_path)
+
+def _load_ics_file(file_path):
+    global _data
+    from .amlich_ics import file_key, load_snapshot, save_snapshot
+
+    _LOGGER.debug("Đang tải file ICS từ: %s", file_path)
+    started = time.perf_counter()
+    trace = start_trace(_LOGGER, 'load_ics_file', file_path)
     try:
         if not os.path.isfile(file_path):
-            _LOGGER.error(f"File ICS không tồn tại hoặc không phải file: {file_path}")
+            _LOGGER.error("File ICS không tồn tại hoặc không phải file: %s", file_path)
             return False
-        with open(file_path, 'r', encoding='utf-8') as f:
-            _LOGGER.debug("Đang đọc nội dung file ICS")
-            ics_content = f.read()
-            if not ics_content.strip():
-                _LOGGER.error("File ICS rỗng")
-                return False
-            cal = Calendar.from_ical(ics_content)
-            _LOGGER.debug("Đã phân tích file ICS thành công")
-            for event in cal.walk('VEVENT'):
-                start_date = event.get('DTSTART').dt
-                summary = event.get('SUMMARY')
-                _LOGGER.debug(f"Processing event: DTSTART={start_date}, SUMMARY={summary}")
-                if isinstance(start_date, datetime):
-                    start_date = start_date.date()
-                if re.match(r'^\d{1,2}/\d{1,2}(?:\s*\(N\))?$', summary):
-                    lunar_date = summary.replace('(N)', '').strip()
-                    try:
-                        day, month = map(int, lunar_date.split('/'))
-                        if not (1 <= day <= 31 and 1 <= month <= 12):
-                            _LOGGER.error(f"Invalid lunar date format: {lunar_date}")
-                            continue
-                        lunar_date = f"{day:02d}/{month:02d}"
-                        if start_date in _lunar_dates:
-                            _LOGGER.error(f"Duplicate lunar date for {start_date}: existing={_lunar_dates[start_date]}, new={lunar_date}")
-                            continue
-                        _lunar_dates[start_date] = lunar_date
-                        if lunar_date not in _solar_dates:
-                            _solar_dates[lunar_date] = []
-                        _solar_dates[lunar_date].append(start_date)
-                        _LOGGER.debug(f"Mapped lunar date {lunar_date} → solar date {start_date.strftime('%Y-%m-%d')}")
-                    except ValueError:
-                        _LOGGER.error(f"Invalid lunar date format: {lunar_date}")
-                        continue
-                else:
-                    if start_date not in _events:
-                        _events[start_date] = []
-                    _events[start_date].append(summary)
-                    _LOGGER.debug(f"Added event for {start_date}: {summary}")
-            _LOGGER.info(f"Đã tải {len(_lunar_dates)} ngày âm lịch, "
-                         f"{len(_solar_dates)} ánh xạ âm lịch-dương lịch, "
-                         f"{sum(len(e) for e in _events.values())} sự kiện")
-            date_obj = datetime.strptime('2025-05-15', '%Y-%m-%d').date()
-            if date_obj in _lunar_dates:
-                _LOGGER.debug(f"_lunar_dates[2025-05-15]: {_lunar_dates[date_obj]}")
+        key = file_key(file_path)
+        trace.mark('file_key')
+        day_table = _data.day_table
+        snapshot = load_snapshot(file_path, key, DAY_TABLE_START_YEAR, DAY_TABLE_END_YEAR)
+        trace.mark('snapshot')
+        if snapshot is not None:
+            payload, table = snapshot
+            _data = CalendarData(payload['events'], payload['records'], day_table or table,
+                                 EventIndex(payload['events'], payload['records']), SearchIndex(payload['records']))
+            trace.mark('index')
+            trace.finish('snapshot')
+            _LOGGER.info("Đã tải %s sự kiện từ snapshot (khởi động ấm) trong %.1f ms",
+                         len(_data.records), (time.perf_counter() - started) * 1000)
             return True
+        if day_table is None:
+            day_table = LunarDayTable(DAY_TABLE_START_YEAR, DAY_TABLE_END_YEAR)
+            _LOGGER.debug("Đã lập bảng âm lịch %s ngày (%s bytes)", len(day_table), day_table.nbytes)
+            trace.mark('day_table')
+        records, skipped_lunar = _read_records(file_path)
+        _LOGGER.debug("Đã phân tích file ICS thành công")
+        trace.mark('parse_ics')
+        events = _build_events(records)
+        _data = CalendarData(events, records, day_table, EventIndex(events, records), SearchIndex(records))
+        trace.mark('index')
+        save_snapshot(file_path, key, {'events': events, 'records': records}, day_table)
+        trace.mark('save_snapshot')
+        trace.finish('ics')
+        _LOGGER.info("Đã tải %s sự kiện, bỏ qua %s ngày âm lịch có sẵn trong file ICS "
+                     "(khởi động nguội) trong %.1f ms",
+                     len(records), skipped_lunar, (time.perf_counter() - started) * 1000)
+        return True
     except UnicodeDecodeError as e:
-        _LOGGER.error(f"Lỗi mã hóa khi đọc file ICS: {str(e)}")
+        _LOGGER.error("Lỗi mã hóa khi đọc file ICS: %s", e)
         return False
     except ValueError as e:
-        _LOGGER.error(f"Lỗi định dạng ICS không hợp lệ: {str(e)}")
+        _LOGGER.error("Lỗi định dạng ICS không hợp lệ: %s", e)
         return False
     except Exception as e:
-        _LOGGER.error(f"Lỗi không xác định khi tải file ICS: {str(e)}")
+        _LOGGER.error("Lỗi không xác định khi tải file ICS: %s", e)
         return False
 
-def get_lunar_year(solar_date, lunar_dates):
-    _LOGGER.debug(f"Determining lunar year for solar date: {solar_date}")
-    year = solar_date.year
-    for offset in [0, -1]:
-        check_year = year + offset
-        lunar_new_year_key = '01/01'
-        new_year_dates = []
-        for date, lunar in lunar_dates.items():
-            if lunar == lunar_new_year_key and date.year == check_year:
-                new_year_dates.append(date)
-        for new_year_date in sorted(new_year_dates):
-            _LOGGER.debug(f"Found lunar new year: {new_year_date}")
-            if solar_date < new_year_date:
-                lunar_year = check_year - 1
+def reload_ics_file(file_path):
+    """Tải lại file ICS, chỉ cập nhật các VEVENT đã thêm, xóa hoặc sửa (theo UID và SEQUENCE/nội dung).
+
+    Trả về dict các VEVENT 'added', 'removed', 'modified' dạng (SEQUENCE, mã băm, ngày, summary, ngày kết thúc),
+    hoặc None nếu không tải được file.
+    """
+    global _data
+    from .amlich_ics import file_key, load_snapshot, save_snapshot
+
+    with _load_lock:
+        current = _data
+        if not current.records and not current.events:
+            _LOGGER.debug("Chưa có dữ liệu ICS, tải toàn bộ file")
+            if not _load_ics_file(file_path):
+                return None
+            return {'added': list(_data.records.values()), 'removed': [], 'modified': []}
+        _LOGGER.debug("Đang tải lại file ICS từ: %s", file_path)
+        started = time.perf_counter()
+        trace = start_trace(_LOGGER, 'reload_ics_file', file_path)
+        try:
+            if not os.path.isfile(file_path):
+                _LOGGER.error("File ICS không tồn tại hoặc không phải file: %s", file_path)
+                return None
+            key = file_key(file_path)
+            trace.mark('file_key')
+            snapshot = load_snapshot(file_path, key, DAY_TABLE_START_YEAR, DAY_TABLE_END_YEAR)
+            if snapshot is not None:
+                records = snapshot[0]['records']
+                trace.mark('snapshot')
             else:
-                lunar_year = check_year
-            _LOGGER.debug(f"Lunar year for {solar_date}: {lunar_year}")
-            return lunar_year
-    _LOGGER.debug(f"No lunar new year found, defaulting to {year}")
-    return year
+                records, _ = _read_records(file_path)
+                trace.mark('parse_ics')
+            events, changes = _patch_events(current.events, current.records, records)
+            trace.mark('patch')
+            _data = CalendarData(events, records, current.day_table, EventIndex(events, records),
+                                 SearchIndex(records))
+            trace.mark('index')
+            if snapshot is None:
+                save_snapshot(file_path, key, {'events': events, 'records': records}, current.day_table)
+                trace.mark('save_snapshot')
+            trace.finish({kind: len(items) for kind, items in changes.items()})
+            _LOGGER.info("Đã tải lại file ICS trong %.1f ms: thêm %s, xóa %s, sửa %s sự kiện",
+                         (time.perf_counter() - started) * 1000,
+                         len(changes['added']), len(changes['removed']), len(changes['modified']))
+            return changes
+        except UnicodeDecodeError as e:
+            _LOGGER.error("Lỗi mã hóa khi đọc file ICS: %s", e)
+            return None
+        except ValueError as e:
+            _LOGGER.error("Lỗi định dạng ICS không hợp lệ: %s", e)
+            return None
+        except Exception as e:
+            _LOGGER.error("Lỗi không xác định khi tải lại file ICS: %s", e)
+            return None
+
+def get_lunar_date(solar_date, day_table=None):
+    if day_table is None:
+        return solar_to_lunar(solar_date)
+    return day_table.lunar(solar_date)
+
+def get_solar_date(day, month, year, leap=False, day_table=None):
+    if day_table is None:
+        return lunar_to_solar(day, month, year, leap)
+    return day_table.solar(day, month, year, leap)
+
+# Bảng số đếm 1-10 sau dấu ':' (ví dụ 'thứ: 2'); '4' đọc là 'tư'
+_NUMBER_WORDS = {
+    '1': 'một', '2': 'hai', '3': 'ba', '4': 'tư', '5': 'năm',
+    '6': 'sáu', '7': 'bảy', '8': 'tám', '9': 'chín', '10': 'mười',
+    'cn': 'chủ nhật', 'chủ nhật': 'chủ nhật'
+}
+_NUMBER_TOKEN = re.compile(
+    r'(?<!\d[/-])(?<!\d): (' + '|'.join(sorted(map(re.escape, _NUMBER_WORDS), key=len, reverse=True)) + r')\b(?![/-]\d)',
+    re.IGNORECASE
+)
+
+_WEEKDAY_WORDS = {
+    'thứ 2': 'thứ hai', 'thứ 3': 'thứ ba', 'thứ 4': 'thứ tư', 'thứ 5': 'thứ năm',
+    'thứ 6': 'thứ sáu', 'thứ 7': 'thứ bảy'
+}
+_WEEKDAY_PREFIX = re.compile(r'thứ [2-7]')
 
 def normalize_numbers_and_days(input_text):
-    _LOGGER.debug(f"Normalizing numbers and days: {input_text}")
-    number_map = {
-        '1': 'một', '2': 'hai', '3': 'ba', '4': 'bốn', '4': 'tư', '5': 'năm',
-        '6': 'sáu', '7': 'bảy', '8': 'tám', '9': 'chín', '10': 'mười',
-        'cn': 'chủ nhật', 'chủ nhật': 'chủ nhật'
-    }
-    for key, value in number_map.items():
-        pattern = rf'(?<!\d[/-])(?<!\d)\: {key}\b(?![/-]\d)'
-        input_text = re.sub(pattern, value, input_text, flags=re.IGNORECASE)
-    _LOGGER.debug(f"Normalized to: {input_text}")
+    _LOGGER.debug("Normalizing numbers and days: %s", input_text)
+    input_text = _NUMBER_TOKEN.sub(lambda m: _NUMBER_WORDS[m.group(1).lower()], input_text)
+    _LOGGER.debug("Normalized to: %s", input_text)
     return input_text
 
 def normalize_weekday(input_text):
-    _LOGGER.debug(f"Normalizing weekday: {input_text}")
-    weekday_map = {
-        'thứ 2': 'thứ hai',
-        'thứ hai': 'thứ hai',
-        'thứ Hai': 'thứ hai',
-        'thứ 3': 'thứ ba',
-        'thứ ba': 'thứ ba',
-        'thứ Ba': 'thứ ba',
-        'thứ 4': 'thứ tư',
-        'thứ tư': 'thứ tư',
-        'thứ Tư': 'thứ tư',
-        'thứ 5': 'thứ năm',
-        'thứ năm': 'thứ năm',
-        'thứ Năm': 'thứ năm',
-        'thứ 6': 'thứ sáu',
-        'thứ sáu': 'thứ sáu',
-        'thứ Sáu': 'thứ sáu',
-        'thứ 7': 'thứ bảy',
-        'thứ bảy': 'thứ bảy',
-        'thứ Bảy': 'thứ bảy',
-        'chủ nhật': 'chủ nhật',
-        'Chủ nhật': 'chủ nhật'
-    }
-    for key, value in weekday_map.items():
-        if input_text.lower().startswith(key):
-            normalized = input_text.lower().replace(key, value, 1)
-            _LOGGER.debug(f"Normalized {input_text} to {normalized}")
-            return normalized
+    _LOGGER.debug("Normalizing weekday: %s", input_text)
+    lowered = input_text.lower()
+    match = _WEEKDAY_PREFIX.match(lowered)
+    if match:
+        normalized = _WEEKDAY_WORDS[match.group(0)] + lowered[match.end():]
+        _LOGGER.debug("Normalized %s to %s", input_text, normalized)
+        return normalized
+    if lowered.startswith(('thứ hai', 'thứ ba', 'thứ tư', 'thứ năm', 'thứ sáu', 'thứ bảy', 'chủ nhật')):
+        return lowered
     return input_text
 
-async def fix_spelling(hass: HomeAssistant, input_text):
-    if not GEMINI_API_KEY:
-        _LOGGER.error("Không có Gemini API key được cấu hình")
-        return input_text
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": GEMINI_API_KEY
-    }
-    prompt = f"""Sửa lỗi chính tả trong câu tiếng Việt sau, giữ nguyên ý nghĩa gốc và trả về chỉ câu đã sửa:
-- Xử lý các lỗi như lặp chữ, sai dấu, sai từ.
+_SPELLING_INSTRUCTIONS = """- Xử lý các lỗi như lặp chữ, sai dấu, sai từ.
 - Không sửa các từ số (một, hai, ba,...) hoặc ngày (chủ nhật, cn).
 - Không sửa định dạng ngày như '1/2', '01/02'.
 - Chuẩn hóa các thứ: 'thứ 2' → 'thứ Hai', 'thu nam' → 'thứ Năm', v.v.
@@ -172,49 +354,11 @@ async def fix_spelling(hass: HomeAssistant, input_text):
   - 'am lich hom nay' → 'âm lịch hôm nay'
   - 'sự kien' → 'sự kiện'
   - 'sự kien tháng 1' → 'sự kiện tháng 1'
-  - 'sự kiện 1/2' → 'sự kiện 1/2'
-- Không thêm giải thích, chỉ trả về câu đã sửa.
-
-Input: '{input_text}'"""
-    
-    data = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }],
-        "generationConfig": {
-            "response_mime_type": "text/plain"
-        }
-    }
-    
-    def make_request():
-        try:
-            response = requests.post(GEMINI_API_URL, headers=headers, json=data)
-            _LOGGER.debug(f"Sửa lỗi chính tả - Status code: {response.status_code}")
-            if response.status_code == 200:
-                fixed_text = response.json()['candidates'][0]['content']['parts'][0]['text'].strip()
-                _LOGGER.debug(f"Input gốc: '{input_text}' → Input sửa: '{fixed_text}'")
-                return fixed_text
-            else:
-                _LOGGER.error(f"Lỗi sửa lỗi chính tả: {response.status_code} - {response.text}")
-                return input_text
-        except Exception as e:
-            _LOGGER.error(f"Lỗi khi sửa lỗi chính tả: {str(e)}")
-            return input_text
+  - 'sự kiện 1/2' → 'sự kiện 1/2'"""
 
-    return await hass.async_add_executor_job(make_request)
-
-async def parse_with_gemini(hass: HomeAssistant, input_text):
-    if not GEMINI_API_KEY:
-        _LOGGER.error("Không có Gemini API key được cấu hình")
-        return {'error': 'Không có Gemini API key'}
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": GEMINI_API_KEY
-    }
-    current_date = datetime.now().date()
+def _parse_instructions(current_date):
     current_year = current_date.year
-    prompt = f"""Hôm nay là {current_date.strftime('%Y-%m-%d')}. Hãy phân tích input sau và trả về JSON theo định dạng:
-- Nếu là ngày cụ thể: {{"date": "YYYY-MM-DD"}}
+    return f"""- Nếu là ngày cụ thể: {{"date": "YYYY-MM-DD"}}
 - Nếu là khoảng thời gian: {{"range": {{"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}}}}
 - Nếu không xác định được ngày, trả về: {{"error": "Không thể xác định ngày"}}.
 - Không trả về date hoặc range là null. Không thêm các trường is_event, is_lunar, is_solar.
@@ -234,630 +378,924 @@ Ví dụ:
 - Input: 'ngày này tuần sau' → {{"date": "2025-05-22"}}
 - Input: 'tuần này' → {{"range": {{"start": "2025-05-12", "end": "2025-05-18"}}}}
 - Input: 'tháng sáu' → {{"range": {{"start": "2025-06-01", "end": "2025-06-30"}}}}
-- Input: '1/2' → {{"date": "2025-02-01"}}
+- Input: '1/2' → {{"date": "2025-02-01"}}"""
+
+def _numbered_inputs(texts):
+    return '\n'.join(f"{index}. '{text}'" for index, text in enumerate(texts, 1))
+
+def _valid_parse(result):
+    return isinstance(result, dict) and ('date' in result or 'range' in result or 'error' in result)
+
+async def fix_spelling(hass: HomeAssistant, input_text):
+    if not GEMINI_API_KEY:
+        _LOGGER.error("Không có Gemini API key được cấu hình")
+        return input_text
+    prompt = f"""Sửa lỗi chính tả trong câu tiếng Việt sau, giữ nguyên ý nghĩa gốc và trả về chỉ câu đã sửa:
+{_SPELLING_INSTRUCTIONS}
+- Không thêm giải thích, chỉ trả về câu đã sửa.
+
+Input: '{input_text}'"""
+
+    if _gemini_cache:
+        cached = _gemini_cache.get_spelling(input_text)
+        if cached is not None:
+            _LOGGER.debug("Cache sửa lỗi chính tả: '%s' → '%s'", input_text, cached)
+            return cached
+    try:
+        fixed_text = (await get_gemini_client(hass).generate(prompt)).strip()
+        _LOGGER.debug("Input gốc: '%s' → Input sửa: '%s'", input_text, fixed_text)
+        if _gemini_cache:
+            _gemini_cache.set_spelling(input_text, fixed_text)
+        return fixed_text
+    except GeminiError as e:
+        _LOGGER.error("Lỗi khi sửa lỗi chính tả: %s", e)
+        return input_text
+
+async def fix_spelling_batch(hass: HomeAssistant, input_texts):
+    """Sửa chính tả nhiều câu bằng một lần gọi Gemini, kết quả theo đúng thứ tự."""
+    if not GEMINI_API_KEY:
+        _LOGGER.error("Không có Gemini API key được cấu hình")
+        return list(input_texts)
+    results = [_gemini_cache.get_spelling(text) if _gemini_cache else None for text in input_texts]
+    missing = [text for text, fixed in zip(input_texts, results) if fixed is None]
+    if len(missing) == 1:
+        fixed_texts = [await fix_spelling(hass, missing[0])]
+    elif missing:
+        prompt = f"""Sửa lỗi chính tả trong từng câu tiếng Việt sau, giữ nguyên ý nghĩa gốc:
+{_SPELLING_INSTRUCTIONS}
+- Trả về một mảng JSON các chuỗi đã sửa, mỗi phần tử ứng với một input theo đúng thứ tự, không thêm giải thích.
+
+Input:
+{_numbered_inputs(missing)}"""
+        try:
+            fixed_texts = json.loads(await get_gemini_client(hass).generate(prompt, "application/json"))
+            if not (isinstance(fixed_texts, list) and len(fixed_texts) == len(missing)
+                    and all(isinstance(text, str) for text in fixed_texts)):
+                raise ValueError("Response từ Gemini không khớp số input")
+            fixed_texts = [text.strip() for text in fixed_texts]
+            _LOGGER.debug("Sửa chính tả %s câu trong một lần gọi: %s", len(missing), fixed_texts)
+            if _gemini_cache:
+                for text, fixed in zip(missing, fixed_texts):
+                    _gemini_cache.set_spelling(text, fixed)
+        except (GeminiError, ValueError) as e:
+            _LOGGER.debug("Sửa chính tả hàng loạt thất bại (%s), sửa từng câu", e)
+            fixed_texts = await asyncio.gather(*(fix_spelling(hass, text) for text in missing))
+    else:
+        fixed_texts = []
+    fixed_iter = iter(fixed_texts)
+    return [fixed if fixed is not None else next(fixed_iter) for fixed in results]
+
+async def parse_with_gemini(hass: HomeAssistant, input_text):
+    if not GEMINI_API_KEY:
+        _LOGGER.error("Không có Gemini API key được cấu hình")
+        return {'error': 'Không có Gemini API key'}
+    current_date = datetime.now().date()
+    prompt = f"""Hôm nay là {current_date.strftime('%Y-%m-%d')}. Hãy phân tích input sau và trả về JSON theo định dạng:
+{_parse_instructions(current_date)}
 Input: '{input_text}'"""
     
-    _LOGGER.debug(f"Gọi Gemini AI với input: {input_text}")
-    
-    data = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }],
-        "generationConfig": {
-            "response_mime_type": "application/json"
+    if _gemini_cache:
+        cached = _gemini_cache.get_parse(input_text)
+        if cached is not None:
+            _LOGGER.debug("Cache phân tích Gemini cho input: %s → %s", input_text, cached)
+            return dict(cached)
+
+    _LOGGER.debug("Gọi Gemini AI với input: %s", input_text)
+
+    try:
+        response_text = await get_gemini_client(hass).generate(prompt, "application/json")
+    except GeminiError as e:
+        _LOGGER.debug("Lỗi khi gọi Gemini API: %s", e)
+        if e.status is not None:
+            return {'error': f'Lỗi khi gọi Gemini API: {e.status}'}
+        return {'error': str(e)}
+    _LOGGER.debug("Response JSON từ Gemini AI: %s", response_text)
+    try:
+        result = json.loads(response_text)
+    except ValueError as e:
+        _LOGGER.debug("Response từ Gemini không phải JSON: %s", e)
+        return {'error': 'Response từ Gemini không hợp lệ'}
+    if not _valid_parse(result):
+        _LOGGER.debug("Response từ Gemini thiếu date, range hoặc error")
+        return {'error': 'Response từ Gemini không hợp lệ'}
+    if _gemini_cache and 'error' not in result:
+        _gemini_cache.set_parse(input_text, dict(result))
+    return result
+
+async def parse_with_gemini_batch(hass: HomeAssistant, input_texts):
+    """Phân tích nhiều input bằng một lần gọi Gemini, kết quả theo đúng thứ tự."""
+    if not GEMINI_API_KEY:
+        _LOGGER.error("Không có Gemini API key được cấu hình")
+        return [{'error': 'Không có Gemini API key'} for _ in input_texts]
+    results = [_gemini_cache.get_parse(text) if _gemini_cache else None for text in input_texts]
+    results = [dict(result) if result is not None else None for result in results]
+    missing = [text for text, result in zip(input_texts, results) if result is None]
+    if len(missing) == 1:
+        parsed = [await parse_with_gemini(hass, missing[0])]
+    elif missing:
+        current_date = datetime.now().date()
+        prompt = f"""Hôm nay là {current_date.strftime('%Y-%m-%d')}. Hãy phân tích từng input sau và trả về một mảng JSON, mỗi phần tử ứng với một input theo đúng thứ tự và có định dạng:
+{_parse_instructions(current_date)}
+Input:
+{_numbered_inputs(missing)}"""
+        _LOGGER.debug("Gọi Gemini AI với %s input: %s", len(missing), missing)
+        try:
+            parsed = json.loads(await get_gemini_client(hass).generate(prompt, "application/json"))
+            if not isinstance(parsed, list) or len(parsed) != len(missing):
+                raise ValueError("Response từ Gemini không khớp số input")
+            parsed = [result if _valid_parse(result) else {'error': 'Response từ Gemini không hợp lệ'}
+                      for result in parsed]
+            if _gemini_cache:
+                for text, result in zip(missing, parsed):
+                    if 'error' not in result:
+                        _gemini_cache.set_parse(text, dict(result))
+        except (GeminiError, ValueError) as e:
+            _LOGGER.debug("Phân tích hàng loạt thất bại (%s), phân tích từng input", e)
+            parsed = await asyncio.gather(*(parse_with_gemini(hass, text) for text in missing))
+    else:
+        parsed = []
+    parsed_iter = iter(parsed)
+    return [result if result is not None else next(parsed_iter) for result in results]
+
+# Một lần gọi vừa sửa chính tả vừa phân tích: response JSON buộc theo schema này
+_QUERY_KINDS = {'sự kiện': (True, False, False), 'âm lịch': (False, True, False), 'dương lịch': (False, False, True)}
+_QUERY_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'corrected': {'type': 'STRING'},
+        'kind': {'type': 'STRING', 'enum': list(_QUERY_KINDS)},
+        'date': {'type': 'STRING'},
+        'range': {
+            'type': 'OBJECT',
+            'properties': {'start': {'type': 'STRING'}, 'end': {'type': 'STRING'}},
+            'required': ['start', 'end']
+        },
+        'error': {'type': 'STRING'}
+    },
+    'required': ['corrected', 'kind']
+}
+_QUERY_FIELDS = frozenset(_QUERY_SCHEMA['properties'])
+_ISO_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+async def understand_with_gemini(hass: HomeAssistant, input_text):
+    """Sửa chính tả, phân loại và phân tích ngày của câu truy vấn bằng một lần gọi Gemini.
+
+    Trả về dict đã kiểm tra gồm corrected, kind và đúng một trong date, range,
+    error; {'error': ...} nếu gọi Gemini lỗi; None nếu response không dùng được
+    (người gọi quay về cách sửa chính tả rồi phân tích riêng).
+    """
+    if _gemini_cache:
+        cached = _gemini_cache.get_query(input_text)
+        if cached is not None:
+            _LOGGER.debug("Cache tra cứu Gemini: '%s' → %s", input_text, cached)
+            return dict(cached)
+    current_date = datetime.now().date()
+    prompt = f"""Hôm nay là {current_date.strftime('%Y-%m-%d')}. Câu tra cứu tiếng Việt sau có thể sai chính tả. Trả về một JSON gồm:
+1. corrected: câu đã sửa lỗi chính tả, giữ nguyên ý nghĩa gốc.
+{_SPELLING_INSTRUCTIONS}
+2. kind: 'sự kiện' nếu hỏi sự kiện, 'âm lịch' nếu hỏi ngày âm lịch, còn lại là 'dương lịch'.
+3. Ngày của phần thời gian trong câu đã sửa (bỏ các cụm 'sự kiện', 'âm lịch', 'dương lịch'), thêm đúng một trong các trường:
+{_parse_instructions(current_date)}
+- Với kind 'âm lịch', date là ngày âm lịch ghi trong câu ('15/8' → '{current_date.year}-08-15'), không đổi sang dương lịch.
+
+Input: '{input_text}'"""
+    _LOGGER.debug("Gọi Gemini AI (sửa chính tả và phân tích) với input: %s", input_text)
+    try:
+        response_text = await get_gemini_client(hass).generate(prompt, "application/json",
+                                                                 response_schema=_QUERY_SCHEMA)
+    except GeminiError as e:
+        _LOGGER.debug("Lỗi khi gọi Gemini API: %s", e)
+        if e.status is not None:
+            return {'error': f'Lỗi khi gọi Gemini API: {e.status}'}
+        return {'error': str(e)}
+    _LOGGER.debug("Response JSON từ Gemini AI: %s", response_text)
+    try:
+        result = json.loads(response_text)
+        _check_understood(result, input_text)
+    except ValueError as e:
+        _LOGGER.debug("Response từ Gemini không dùng được (%s): %s", e, response_text)
+        return None
+    if _gemini_cache and 'error' not in result:
+        _gemini_cache.set_query(input_text, dict(result))
+    return result
+
+_COUNT_WORDS = {'một': 1, 'hai': 2, 'ba': 3, 'bốn': 4, 'tư': 4, 'năm': 5, 'sáu': 6, 'bảy': 7}
+# Số ngày lệch so với hôm nay
+_DAY_OFFSETS = {
+    'hôm nay': 0, 'hôm này': 0, 'ngày hôm nay': 0, 'ngày này': 0,
+    'hôm qua': -1, 'hôm kia': -2,
+    'ngày mai': 1, 'hôm sau': 1, 'ngày kia': 2, 'ngày mốt': 2,
+    'ngày này tuần sau': 7, 'hôm nay tuần sau': 7
+}
+_WEEKDAYS = {'thứ hai': 0, 'thứ ba': 1, 'thứ tư': 2, 'thứ năm': 3, 'thứ sáu': 4, 'thứ bảy': 5, 'chủ nhật': 6}
+_WEEK_OFFSETS = {'tuần này': 0, 'tuần trước': -7, 'tuần sau': 7, 'tuần tới': 7}
+_MONTH_NAMES = {
+    'một': 1, 'hai': 2, 'ba': 3, 'bốn': 4, 'tư': 4, 'năm': 5, 'sáu': 6,
+    'bảy': 7, 'tám': 8, 'chín': 9, 'mười': 10, 'mười một': 11, 'mười hai': 12
+}
+# Khoảng thời gian: (số tuần lệch, None) hoặc (None, số tháng lệch)
+_RANGES = {
+    'tuần này': (0, None), 'tuần trước': (-1, None), 'tuần sau': (1, None), 'tuần tới': (1, None),
+    'tháng này': (None, 0), 'tháng sau': (None, 1), 'tháng tới': (None, 1)
+}
+
+def _alternatives(words):
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+# Toàn bộ cú pháp ngày được gộp vào một regex, mỗi nhánh là một nhóm có tên.
+# Thứ tự các nhánh là thứ tự ưu tiên khi một chuỗi khớp nhiều nhánh.
+_DATE_GRAMMAR = re.compile(rf'''
+    (?P<week_count>{_alternatives(_COUNT_WORDS)}|\d+)\s+tuần\s+(?:sau|tới)
+  | (?P<month_count>{_alternatives(_COUNT_WORDS)}|\d+)\s+tháng\s+(?:sau|tới)
+  | (?P<day_offset>{_alternatives(_DAY_OFFSETS)})
+  | (?P<weekday>thứ\s*(?:hai|ba|tư|năm|sáu|bảy)|chủ\ nhật)(?:\s*(?P<week>tuần\s*(?:này|trước|sau|tới)))?
+  | (?P<next_month_day>ngày\ này\ tháng\ sau)
+  | (?P<dmy_day>\d{{1,2}})[/-](?P<dmy_month>\d{{1,2}})[/-](?P<dmy_year>\d{{2,4}})
+  | (?P<dot_day>\d{{1,2}})\.(?P<dot_month>\d{{1,2}})\.(?P<dot_year>\d{{2,4}})
+  | (?P<dm_day>\d{{1,2}})[/-](?P<dm_month>\d{{1,2}})
+  | (?:ngày\s+)?(?P<text_day>\d{{1,2}})\s+tháng\s+(?P<text_month>\d{{1,2}})(?:\s+năm\s+(?P<text_year>\d{{2,4}}))?
+  | tháng\s+(?P<month_name>{_alternatives(_MONTH_NAMES)})
+  | tháng\s+(?P<month_number>\d{{1,2}})
+  | (?P<range>{_alternatives(_RANGES)})
+''', re.VERBOSE)
+
+_DATE_FIELDS = {
+    'dmy_day': ('dmy_day', 'dmy_month', 'dmy_year'),
+    'dot_day': ('dot_day', 'dot_month', 'dot_year'),
+    'dm_day': ('dm_day', 'dm_month', None),
+    'text_day': ('text_day', 'text_month', 'text_year'),
+}
+# Các nhánh cho ra một ngày; 'nhuận' không áp dụng được cho các nhánh khoảng thời gian
+_SINGLE_DAY_GROUPS = ('day_offset', 'weekday', 'next_month_day', *_DATE_FIELDS)
+
+def _format_range(start, end, is_event, is_lunar, is_solar):
+    return {
+        'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
+        'is_event': is_event,
+        'is_lunar': is_lunar,
+        'is_solar': is_solar
+    }
+
+def _month_end(start):
+    return (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+def _resolve_date(solar_date, is_event, is_lunar, is_solar, data, leap=False):
+    """Kết quả cho một ngày; với 'âm lịch', ngày/tháng/năm của solar_date được hiểu là ngày âm lịch
+    (trong tháng nhuận nếu leap)."""
+    if not is_lunar:
+        return {
+            'date': solar_date.strftime('%Y-%m-%d'),
+            'is_event': is_event,
+            'is_lunar': is_lunar,
+            'is_solar': is_solar or (not is_lunar and not is_event)
         }
+    return _resolve_lunar(solar_date.day, solar_date.month, solar_date.year, is_event, data, leap)
+
+def _resolve_lunar(day, month, year, is_event, data, leap=False):
+    """Ngày dương lịch của ngày âm lịch day/month/year (tra thẳng trong bảng âm lịch)."""
+    lunar_date = f"{day:02d}/{month:02d}/{year}" + (" nhuận" if leap else "")
+    try:
+        solar_date = get_solar_date(day, month, year, leap, data.day_table)
+    except (ValueError, OverflowError):
+        solar_date = None
+    if solar_date is None:
+        _LOGGER.debug("No solar date for lunar %s", lunar_date)
+        if leap and day <= 30:
+            return {'error': f'Năm âm lịch {year} không có tháng {month} nhuận'}
+        return {'error': f'Không tìm thấy ngày âm lịch {lunar_date}'}
+    _LOGGER.debug("Selected solar date: %s for lunar %s", solar_date, lunar_date)
+    return {
+        'date': solar_date.strftime('%Y-%m-%d'),
+        'is_event': is_event,
+        'is_lunar': True,
+        'is_solar': False,
+        'lunar_date': lunar_date
     }
-    
-    def make_request():
+
+def _resolve_grammar(match, today, is_event, is_lunar, is_solar, data, leap=False):
+    """Tính kết quả cho nhánh cú pháp đã khớp; None nếu ngày không hợp lệ (chuyển sang Gemini).
+
+    Với 'âm lịch', ngày/tháng/năm viết ra là ngày âm lịch (thiếu năm thì lấy năm
+    nay); leap chọn tháng nhuận, báo lỗi nếu câu là một khoảng thời gian.
+    """
+    groups = match.groupdict()
+    plain_solar = is_solar or (not is_lunar and not is_event)
+    if leap and all(groups[name] is None for name in _SINGLE_DAY_GROUPS):
+        return {'error': "'Nhuận' chỉ dùng được với một ngày âm lịch cụ thể"}
+
+    for name in ('week_count', 'month_count'):
+        num_str = groups[name]
+        if num_str is None:
+            continue
+        num = _COUNT_WORDS.get(num_str, int(num_str) if num_str.isdigit() else 0)
+        if num == 0:
+            _LOGGER.error("Invalid number: %s", num_str)
+            return {'error': f'Số không hợp lệ: {num_str}'}
+        if name == 'week_count':
+            start = today - timedelta(days=today.weekday()) + timedelta(days=7 * num)
+            end = start + timedelta(days=6)
+        else:
+            start = (today.replace(day=1) + timedelta(days=31 * num)).replace(day=1)
+            end = _month_end(start)
+        _LOGGER.debug("Count range parsed - From: %s, To: %s", start, end)
+        return _format_range(start, end, is_event, False, True)
+
+    if groups['day_offset'] is not None:
+        solar_date = today + timedelta(days=_DAY_OFFSETS[groups['day_offset']])
+        _LOGGER.debug("Exact match found - Solar date: %s", solar_date)
+        return _resolve_date(solar_date, is_event, is_lunar, is_solar, data, leap)
+
+    if groups['weekday'] is not None:
+        weekday_str = groups['weekday'].strip()
+        week_modifier_str = groups['week'] or 'tuần này'
+        _LOGGER.debug("Weekday parsed: %s, week modifier: %s", weekday_str, week_modifier_str)
+        if weekday_str not in _WEEKDAYS:
+            return {'error': f'Thứ không hợp lệ: {weekday_str}'}
+        days_diff = _WEEKDAYS[weekday_str] - today.weekday()
+        solar_date = today + timedelta(days=days_diff + _WEEK_OFFSETS[week_modifier_str])
+        _LOGGER.debug("Calculated solar date: %s", solar_date)
+        return _resolve_date(solar_date, is_event, is_lunar, is_solar, data, leap)
+
+    if groups['next_month_day'] is not None:
+        solar_date = (today + timedelta(days=31)).replace(day=today.day)
+        _LOGGER.debug("Parsed 'ngày này tháng sau' - Date: %s", solar_date)
+        return _resolve_date(solar_date, is_event, is_lunar, is_solar, data, leap)
+
+    for name, (day_group, month_group, year_group) in _DATE_FIELDS.items():
+        if groups[name] is None:
+            continue
+        day, month = int(groups[day_group]), int(groups[month_group])
+        year_str = groups[year_group] if year_group else None
+        year = int(year_str) if year_str else today.year
+        if len(str(year)) == 2:
+            year = 2000 + year
+        _LOGGER.debug("Date pattern matched - Day: %s, Month: %s, Year: %s", day, month, year)
+        if is_lunar:
+            if not (1 <= day <= 30 and 1 <= month <= 12):
+                _LOGGER.debug("Invalid lunar date: %s/%s/%s", day, month, year)
+                return None
+            return _resolve_lunar(day, month, year, is_event, data, leap)
         try:
-            response = requests.post(GEMINI_API_URL, headers=headers, json=data)
-            _LOGGER.debug(f"Status code từ Gemini API: {response.status_code}")
-            if response.status_code == 200:
-                response_json = response.json()
-                if 'candidates' in response_json and response_json['candidates']:
-                    response_text = response_json['candidates'][0]['content']['parts'][0]['text']
-                    _LOGGER.debug(f"Response JSON từ Gemini AI: {response_text}")
-                    result = json.loads(response_text)
-                    if 'date' not in result and 'range' not in result and 'error' not in result:
-                        _LOGGER.debug("Response từ Gemini thiếu date, range hoặc error")
-                        return {'error': 'Response từ Gemini không hợp lệ'}
-                    return result
-                else:
-                    _LOGGER.debug("Không tìm thấy 'candidates' trong response từ Gemini")
-                    return {'error': 'Response từ Gemini AI không hợp lệ'}
-            else:
-                _LOGGER.debug(f"Lỗi Gemini API: {response.status_code} - {response.text}")
-                return {'error': f'Lỗi khi gọi Gemini API: {response.status_code}'}
-        except Exception as e:
-            _LOGGER.debug(f"Lỗi khi gọi Gemini API: {str(e)}")
-            return {'error': f'Lỗi kết nối Gemini API: {str(e)}'}
+            return _resolve_date(datetime(year, month, day).date(), is_event, is_lunar, is_solar, data)
+        except ValueError:
+            _LOGGER.debug("Invalid date: %s/%s/%s", day, month, year)
+            return None
 
-    return await hass.async_add_executor_job(make_request)
+    month = None
+    if groups['month_name'] is not None:
+        month = _MONTH_NAMES[groups['month_name']]
+    elif groups['month_number'] is not None:
+        month = int(groups['month_number'])
+        if not 1 <= month <= 12:
+            return None
+    if month is not None:
+        start = today.replace(month=month, day=1)
+        end = _month_end(start)
+        _LOGGER.debug("Month parsed - Month: %s, Range: %s to %s", month, start, end)
+        return _format_range(start, end, is_event, is_lunar, plain_solar)
 
-async def parse_input(hass: HomeAssistant, input_text, is_fixed=False):
-    _LOGGER.debug(f"Parsing input: {input_text}, is_fixed={is_fixed}")
-    original_input = input_text
-    input_text = input_text.lower().strip()
-    # Chuẩn hóa input để xử lý ký tự ẩn, khoảng trắng thừa
-    input_text = re.sub(r'\s+', ' ', input_text).strip()
-    is_event = 'sự kiện' in input_text.lower()
-    input_text = normalize_numbers_and_days(input_text)
-    input_text = normalize_weekday(input_text)
-    today = datetime.now().date()
-    _LOGGER.debug(f"Current date: {today}")
+    weeks, months = _RANGES[groups['range']]
+    if weeks is not None:
+        start = today - timedelta(days=today.weekday()) + timedelta(days=7 * weeks)
+        end = start + timedelta(days=6)
+    else:
+        start = today.replace(day=1)
+        if months:
+            start = (start + timedelta(days=31)).replace(day=1)
+        end = _month_end(start)
+    _LOGGER.debug("Range match parsed - From: %s, To: %s", start, end)
+    return _format_range(start, end, is_event, is_lunar, plain_solar)
 
+def _split_query(input_text):
+    """Chuẩn hóa câu truy vấn, trả về (phần ngày, is_event, is_lunar, is_solar)."""
+    # Chuẩn hóa input để xử lý ký tự ẩn, khoảng trắng thừa
+    input_text = ' '.join(input_text.lower().split())
+    is_event = 'sự kiện' in input_text
+    input_text = normalize_weekday(normalize_numbers_and_days(input_text))
     is_lunar = 'âm lịch' in input_text
     is_solar = 'dương lịch' in input_text
-    _LOGGER.debug(f"Initial flags: is_event={is_event}, is_lunar={is_lunar}, is_solar={is_solar}")
+    _LOGGER.debug("Initial flags: is_event=%s, is_lunar=%s, is_solar=%s", is_event, is_lunar, is_solar)
     date_part = input_text
     if is_event:
         date_part = date_part.replace('sự kiện', '', 1).strip()
-        _LOGGER.debug(f"Removed 'sự kiện', date_part: {date_part}")
     if is_lunar:
         date_part = date_part.replace('âm lịch', '').strip()
-        _LOGGER.debug(f"Removed 'âm lịch', date_part: {date_part}")
     if is_solar:
         date_part = date_part.replace('dương lịch', '').strip()
-        _LOGGER.debug(f"Removed 'dương lịch', date_part: {date_part}")
+    _LOGGER.debug("Date part: %s", date_part)
+    return date_part, is_event, is_lunar, is_solar
 
-    week_pattern = r'^(một|hai|ba|bốn|tư|năm|sáu|bảy|\d+)\s+tuần\s+(sau|tới)$'
-    match = re.match(week_pattern, date_part)
-    if match:
-        num_str = match.group(1)
-        num_dict = {'một': 1, 'hai': 2, 'ba': 3, 'bốn': 4, 'tư': 4, 'năm': 5, 'sáu': 6, 'bảy': 7}
-        num = num_dict.get(num_str, int(num_str) if num_str.isdigit() else 0)
-        if num == 0:
-            _LOGGER.error(f"Invalid number: {num_str}")
-            return {'error': f'Số không hợp lệ: {num_str}'}
-        _LOGGER.debug(f"Week pattern matched - Number: {num}")
-        start = today - timedelta(days=today.weekday()) + timedelta(days=7 * num)
-        end = start + timedelta(days=6)
-        _LOGGER.debug(f"Week range parsed - From: {start}, To: {end}")
-        return {
-            'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
-            'is_event': is_event,
-            'is_lunar': False,
-            'is_solar': True
-        }
+def _parse_local(date_part, is_event, is_lunar, is_solar, data):
+    """Phân tích bằng cú pháp cục bộ, None nếu không khớp."""
+    leap = is_lunar and 'nhuận' in date_part
+    if leap:
+        date_part = ' '.join(date_part.replace('nhuận', ' ').split())
+    match = _DATE_GRAMMAR.fullmatch(date_part)
+    if match is None:
+        return None
+    today = datetime.now().date()
+    _LOGGER.debug("Current date: %s", today)
+    return _resolve_grammar(match, today, is_event, is_lunar, is_solar, data, leap)
 
-    month_pattern = r'^(một|hai|ba|bốn|tư|năm|sáu|bảy|\d+)\s+tháng\s+(sau|tới)$'
-    match = re.match(month_pattern, date_part)
-    if match:
-        num_str = match.group(1)
-        num_dict = {'một': 1, 'hai': 2, 'ba': 3, 'bốn': 4, 'tư': 4, 'năm': 5, 'sáu': 6, 'bảy': 7}
-        num = num_dict.get(num_str, int(num_str) if num_str.isdigit() else 0)
-        if num == 0:
-            _LOGGER.error(f"Invalid number: {num_str}")
-            return {'error': f'Số không hợp lệ: {num_str}'}
-        _LOGGER.debug(f"Month pattern matched - Number: {num}")
-        start = (today.replace(day=1) + timedelta(days=31 * num)).replace(day=1)
-        end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-        _LOGGER.debug(f"Month range parsed - From: {start}, To: {end}")
-        return {
-            'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
-            'is_event': is_event,
-            'is_lunar': False,
-            'is_solar': True
-        }
+def _parse_corrected(input_text, data):
+    """Sửa lỗi gõ/thiếu dấu tại chỗ rồi phân tích lại, None nếu vẫn không được."""
+    corrected = correct_query(input_text)
+    if corrected == ' '.join(input_text.lower().split()):
+        return None
+    result = _parse_local(*_split_query(corrected), data)
+    if result is None or 'error' in result:
+        return None
+    _LOGGER.debug("Sửa cục bộ: '%s' → '%s'", input_text, corrected)
+    return result
 
-    _LOGGER.debug(f"Checking exact matches for date_part: {date_part}")
-    exact_matches = {
-        'hôm nay': today,
-        'hôm này': today,
-        'ngày hôm nay': today,
-        'ngày này': today,
-        'hôm qua': today - timedelta(days=1),
-        'hôm kia': today - timedelta(days=2),
-        'ngày mai': today + timedelta(days=1),
-        'hôm sau': today + timedelta(days=1),
-        'ngày kia': today + timedelta(days=2),
-        'ngày mốt': today + timedelta(days=2),
-        'ngày này tuần sau': today + timedelta(days=7),
-        'hôm nay tuần sau': today + timedelta(days=7)
-    }
-    if date_part in exact_matches:
-        solar_date = exact_matches[date_part]
-        _LOGGER.debug(f"Exact match found - Solar date: {solar_date}")
-        if is_lunar:
-            day, month = solar_date.day, solar_date.month
-            lunar_date = f"{day:02d}/{month:02d}"
-            lunar_year = get_lunar_year(solar_date, _lunar_dates)
-            lunar_date_with_year = f"{lunar_date}/{lunar_year}"
-            _LOGGER.debug(f"Assuming solar date {solar_date} as lunar date: {lunar_date_with_year}")
-            if lunar_date in _solar_dates:
-                solar_dates = sorted(_solar_dates[lunar_date])
-                _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-                selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(lunar_year, month, day).date() - d).days))
-                _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-                return {
-                    'date': selected_solar_date.strftime('%Y-%m-%d'),
-                    'is_event': is_event,
-                    'is_lunar': True,
-                    'is_solar': False,
-                    'lunar_date': lunar_date_with_year
-                }
-            else:
-                _LOGGER.error(f"No solar dates found for lunar {lunar_date}")
-                return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
-        else:
-            return {
-                'date': solar_date.strftime('%Y-%m-%d'),
-                'is_event': is_event,
-                'is_lunar': is_lunar,
-                'is_solar': is_solar or (not is_lunar and not is_event)
-            }
-
-    _LOGGER.debug(f"Checking weekday matches for date_part: {date_part}")
-    weekday_matches = {
-        'thứ hai': 0,
-        'thứ ba': 1,
-        'thứ tư': 2,
-        'thứ năm': 3,
-        'thứ sáu': 4,
-        'thứ bảy': 5,
-        'chủ nhật': 6
-    }
-    week_modifiers = {
-        'tuần này': 0,
-        'tuần trước': -7,
-        'tuần sau': 7,
-        'tuần tới': 7
-    }
-    weekday_pattern = r'^(thứ\s*(?:hai|ba|tư|năm|sáu|bảy)|chủ nhật)(?:\s*(tuần\s*(?:này|trước|sau|tới)))?$'
-    match = re.match(weekday_pattern, date_part)
-    if match:
-        weekday_str = match.group(1).strip()
-        week_modifier_str = match.group(2) if match.group(2) else 'tuần này'
-        _LOGGER.debug(f"Weekday parsed: {weekday_str}, week modifier: {week_modifier_str}")
-        if weekday_str not in weekday_matches:
-            return {'error': f'Thứ không hợp lệ: {weekday_str}'}
-        weekday = weekday_matches[weekday_str]
-        week_offset = week_modifiers[week_modifier_str]
-        current_weekday = today.weekday()
-        days_diff = weekday - current_weekday
-        solar_date = today + timedelta(days=days_diff + week_offset)
-        _LOGGER.debug(f"Calculated solar date: {solar_date}")
-        if is_lunar:
-            day, month = solar_date.day, solar_date.month
-            lunar_date = f"{day:02d}/{month:02d}"
-            lunar_year = get_lunar_year(solar_date, _lunar_dates)
-            lunar_date_with_year = f"{lunar_date}/{lunar_year}"
-            _LOGGER.debug(f"Assuming solar date {solar_date} as lunar date: {lunar_date_with_year}")
-            if lunar_date in _solar_dates:
-                solar_dates = sorted(_solar_dates[lunar_date])
-                _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-                selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(lunar_year, month, day).date() - d).days))
-                _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-                return {
-                    'date': selected_solar_date.strftime('%Y-%m-%d'),
-                    'is_event': is_event,
-                    'is_lunar': True,
-                    'is_solar': False,
-                    'lunar_date': lunar_date_with_year
-                }
-            else:
-                _LOGGER.error(f"No solar dates found for lunar {lunar_date}")
-                return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
-        else:
-            return {
-                'date': solar_date.strftime('%Y-%m-%d'),
-                'is_event': is_event,
-                'is_lunar': is_lunar,
-                'is_solar': is_solar or (not is_lunar and not is_event)
-            }
+# Câu hỏi về sự kiện theo tên, so khớp trên chuỗi đã bỏ dấu:
+# 'khi nào (là) tết trung thu', 'bao giờ đến giỗ tổ', 'lễ phật đản vào ngày nào', '... năm 2030 ngày nào'
+_EVENT_ASK = r'(?:khi nao|bao gio|ngay nao|hom nao|luc nao)'
+_EVENT_LEADING = re.compile(rf'^{_EVENT_ASK}(?: (?:thi|la|den|toi|co))* ')
+_EVENT_TRAILING = re.compile(rf'(?: (?:la|vao|dien ra|se|roi))* {_EVENT_ASK}$')
+_EVENT_YEAR = re.compile(r' (?:vao )?nam (\d{4})$')
+_PUNCTUATION = re.compile(r'[^\w\s]')
 
-    if is_lunar:
-        _LOGGER.debug(f"Processing lunar input: {date_part}")
-        lunar_pattern = r'^(\d{1,2})[/-](\d{1,2})$'
-        match = re.match(lunar_pattern, date_part)
-        if match:
-            day, month = map(int, match.groups()[:2])
-            year = today.year
-            lunar_date = f"{day:02d}/{month:02d}"
-            lunar_date_with_year = f"{lunar_date}/{year}"
-            _LOGGER.debug(f"Lunar input parsed: day={day}, month={month}, year={year}, normalized={lunar_date_with_year}")
-            if lunar_date in _solar_dates:
-                start_date = datetime(year, max(1, month - 3), 1).date()
-                end_date = datetime(year, month + 3, 1).date() - timedelta(days=1)
-                _LOGGER.debug(f"Search range: {start_date} to {end_date}")
-                solar_dates = sorted([d for d in _solar_dates[lunar_date] if start_date <= d <= end_date])
-                _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-                if solar_dates:
-                    selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(year, month, 1).date() - d).days))
-                    _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-                    return {
-                        'date': selected_solar_date.strftime('%Y-%m-%d'),
-                        'is_event': is_event,
-                        'is_lunar': True,
-                        'is_solar': False,
-                        'lunar_date': lunar_date_with_year
-                    }
-                else:
-                    _LOGGER.error(f"No solar dates found for lunar {lunar_date} in range")
-                    return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong khoảng thời gian hợp lý'}
-            else:
-                _LOGGER.error(f"No lunar date {lunar_date} found in _solar_dates")
-                return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
+def _split_event_question(input_text):
+    """Trả về (tên sự kiện đã bỏ dấu, năm hoặc None), None nếu không phải câu hỏi về sự kiện.
 
-    if date_part == 'ngày này tháng sau':
-        solar_date = (today + timedelta(days=31)).replace(day=today.day)
-        _LOGGER.debug(f"Parsed 'ngày này tháng sau' - Date: {solar_date}")
-        if is_lunar:
-            day, month = solar_date.day, solar_date.month
-            lunar_date = f"{day:02d}/{month:02d}"
-            lunar_year = get_lunar_year(solar_date, _lunar_dates)
-            lunar_date_with_year = f"{lunar_date}/{lunar_year}"
-            _LOGGER.debug(f"Assuming solar date {solar_date} as lunar date: {lunar_date_with_year}")
-            if lunar_date in _solar_dates:
-                solar_dates = sorted(_solar_dates[lunar_date])
-                _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-                selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(lunar_year, month, day).date() - d).days))
-                _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-                return {
-                    'date': selected_solar_date.strftime('%Y-%m-%d'),
-                    'is_event': is_event,
-                    'is_lunar': True,
-                    'is_solar': False,
-                    'lunar_date': lunar_date_with_year
-                }
-            else:
-                _LOGGER.error(f"No solar dates found for lunar {lunar_date}")
-                return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
+    Phải có 'khi nào/bao giờ/ngày nào...'; '<tên> năm YYYY' không có từ hỏi
+    (như 'sự kiện năm 2026') không phải câu hỏi về sự kiện.
+    """
+    text = ' '.join(_PUNCTUATION.sub(' ', fold(input_text)).split())
+    asked = False
+    year = None
+    for pattern in (_EVENT_YEAR, _EVENT_TRAILING, _EVENT_YEAR, _EVENT_LEADING):
+        match = pattern.search(text)
+        if match is None:
+            continue
+        if pattern is _EVENT_YEAR:
+            if year is not None:
+                continue
+            year = int(match.group(1))
         else:
-            return {
-                'date': solar_date.strftime('%Y-%m-%d'),
-                'is_event': is_event,
-                'is_lunar': is_lunar,
-                'is_solar': is_solar or (not is_lunar and not is_event)
-            }
-
-    _LOGGER.debug(f"Checking date patterns for: {date_part}")
-    date_patterns = [
-        r'^(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})$',
-        r'^(\d{1,2})\.(\d{1,2})\.(\d{2,4})$',
-        r'^(\d{1,2})[/-](\d{1,2})$',
-    ]
-    for pattern in date_patterns:
-        match = re.match(pattern, date_part)
-        if match:
-            day, month = map(int, match.groups()[:2])
-            year = int(match.groups()[2]) if len(match.groups()) > 2 else today.year
-            if len(str(year)) == 2:
-                year = 2000 + year
-            _LOGGER.debug(f"Date pattern matched - Day: {day}, Month: {month}, Year: {year}")
-            try:
-                solar_date = datetime(year, month, day).date()
-                _LOGGER.debug(f"Parsed date: {solar_date}")
-                if is_lunar:
-                    day, month = solar_date.day, solar_date.month
-                    lunar_date = f"{day:02d}/{month:02d}"
-                    lunar_year = get_lunar_year(solar_date, _lunar_dates)
-                    lunar_date_with_year = f"{lunar_date}/{lunar_year}"
-                    _LOGGER.debug(f"Assuming solar date {solar_date} as lunar date: {lunar_date_with_year}")
-                    if lunar_date in _solar_dates:
-                        solar_dates = sorted(_solar_dates[lunar_date])
-                        _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-                        selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(lunar_year, month, day).date() - d).days))
-                        _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-                        return {
-                            'date': selected_solar_date.strftime('%Y-%m-%d'),
-                            'is_event': is_event,
-                            'is_lunar': True,
-                            'is_solar': False,
-                            'lunar_date': lunar_date_with_year
-                        }
-                    else:
-                        _LOGGER.error(f"No solar dates found for lunar {lunar_date}")
-                        return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
-                else:
-                    return {
-                        'date': solar_date.strftime('%Y-%m-%d'),
-                        'is_event': is_event,
-                        'is_lunar': is_lunar,
-                        'is_solar': is_solar or (not is_lunar and not is_event)
-                    }
-            except ValueError:
-                _LOGGER.debug(f"Invalid date: {day}/{month}/{year}")
-                pass
-
-    _LOGGER.debug(f"Checking text pattern for: {date_part}")
-    text_pattern = r'^(?:ngày\s+)?(\d{1,2})\s+tháng\s+(\d{1,2})(?:\s+năm\s+(\d{2,4}))?$'
-    match = re.match(text_pattern, date_part)
-    if match:
-        day, month = map(int, match.groups()[:2])
-        year = int(match.groups()[2]) if match.groups()[2] else today.year
-        if len(str(year)) == 2:
-            year = 2000 + year
-        _LOGGER.debug(f"Text pattern matched - Day: {day}, Month: {month}, Year: {year}")
-        try:
-            solar_date = datetime(year, month, day).date()
-            _LOGGER.debug(f"Parsed date: {solar_date}")
-            if is_lunar:
-                day, month = solar_date.day, solar_date.month
-                lunar_date = f"{day:02d}/{month:02d}"
-                lunar_year = get_lunar_year(solar_date, _lunar_dates)
-                lunar_date_with_year = f"{lunar_date}/{lunar_year}"
-                _LOGGER.debug(f"Assuming solar date {solar_date} as lunar date: {lunar_date_with_year}")
-                if lunar_date in _solar_dates:
-                    solar_dates = sorted(_solar_dates[lunar_date])
-                    _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-                    selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(lunar_year, month, day).date() - d).days))
-                    _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-                    return {
-                        'date': selected_solar_date.strftime('%Y-%m-%d'),
-                        'is_event': is_event,
-                        'is_lunar': True,
-                        'is_solar': False,
-                        'lunar_date': lunar_date_with_year
-                    }
-                else:
-                    _LOGGER.error(f"No solar dates found for lunar {lunar_date}")
-                    return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
-            else:
-                return {
-                    'date': solar_date.strftime('%Y-%m-%d'),
-                    'is_event': is_event,
-                    'is_lunar': is_lunar,
-                    'is_solar': is_solar or (not is_lunar and not is_event)
-                }
-        except ValueError:
-            _LOGGER.debug(f"Invalid date: {day}/{month}/{year}")
-            pass
+            asked = True
+        text = text[:match.start()] + text[match.end():]
+    if not text or not asked:
+        return None
+    return text, year
 
-    _LOGGER.debug(f"Checking month names for: {date_part}")
-    month_names = {
-        'một': 1, 'hai': 2, 'ba': 3, 'bốn': 4, 'tư': 4, 'năm': 5, 'sáu': 6,
-        'bảy': 7, 'tám': 8, 'chín': 9, 'mười': 10, 'mười một': 11, 'mười hai': 12
-    }
-    month_pattern = r'^tháng\s+(.+)$'
-    match = re.match(month_pattern, date_part)
-    if match:
-        month_name = match.group(1).strip()
-        for name, num in month_names.items():
-            if name == month_name:
-                month = num
-                start = today.replace(month=month, day=1)
-                end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-                _LOGGER.debug(f"Month parsed - Month: {month}, Range: {start} to {end}")
-                return {
-                    'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
-                    'is_event': is_event,
-                    'is_lunar': is_lunar,
-                    'is_solar': is_solar or (not is_lunar and not is_event)
-                }
+def _parse_event_question(input_text, date_part, data):
+    """Trả lời câu hỏi ngày diễn ra của một sự kiện từ chỉ mục tên, None nếu không tìm thấy sự kiện.
 
-    _LOGGER.debug(f"Checking month number pattern for: {date_part}")
-    month_num_pattern = r'^tháng\s+(\d{1,2})$'
-    match = re.match(month_num_pattern, date_part)
-    if match:
-        month = int(match.group(1))
-        if 1 <= month <= 12:
-            start = today.replace(month=month, day=1)
-            end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-            _LOGGER.debug(f"Month number parsed - Month: {month}, Range: {start} to {end}")
-            return {
-                'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
-                'is_event': is_event,
-                'is_lunar': is_lunar,
-                'is_solar': is_solar or (not is_lunar and not is_event)
-            }
-
-    _LOGGER.debug(f"Checking range matches for: {date_part}")
-    exact_range_matches = {
-        'tuần này': (today - timedelta(days=today.weekday()), 6),
-        'tuần trước': (today - timedelta(days=today.weekday() + 7), 6),
-        'tuần sau': (today - timedelta(days=today.weekday()) + timedelta(days=7), 6),
-        'tuần tới': (today - timedelta(days=today.weekday()) + timedelta(days=7), 6),
-        'tháng này': (today.replace(day=1), None),
-        'tháng sau': ((today.replace(day=1) + timedelta(days=31)).replace(day=1), None),
-        'tháng tới': ((today.replace(day=1) + timedelta(days=31)).replace(day=1), None)
+    Tên được lấy từ date_part (đã bỏ 'sự kiện', 'âm lịch', 'dương lịch'); chỉ còn từ
+    khóa thì không phải câu hỏi. Tên đầy đủ kèm từ khóa được thử trước để
+    'khi nào tết dương lịch' vẫn tìm đúng Tết Dương Lịch.
+    """
+    question = _split_event_question(date_part)
+    if question is None:
+        return None
+    name_query, year = question
+    full = _split_event_question(input_text)
+    candidates = [full[0], name_query] if full is not None and full[0] != name_query else [name_query]
+    today = datetime.now().date()
+    for candidate in candidates:
+        names = data.search.search(candidate, day=today if year is None else date(year, 1, 1), limit=1)
+        if names:
+            break
+    else:
+        _LOGGER.debug("Không có sự kiện nào khớp với '%s'", name_query)
+        return None
+    name = names[0]
+    if year is None:
+        occurrence = data.search.next_occurrence(name, today)
+        if occurrence is None:
+            return {'error': f'Không còn {name} nào từ hôm nay trở đi trong lịch'}
+    else:
+        occurrence = data.search.occurrence_in_year(name, year)
+        if occurrence is None:
+            return {'error': f'Không có {name} trong năm {year}'}
+    start, end = occurrence
+    _LOGGER.debug("Sự kiện '%s' → %s: %s đến %s", name_query, name, start, end)
+    return {
+        'date': start.strftime('%Y-%m-%d'),
+        'event': name,
+        'event_end': end.strftime('%Y-%m-%d'),
+        'event_year': year,
+        'is_event': True,
+        'is_lunar': False,
+        'is_solar': False
     }
-    for key, (start, days) in exact_range_matches.items():
-        if date_part == key:
-            if days:
-                end = start + timedelta(days=days)
-            else:
-                end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-            _LOGGER.debug(f"Range match parsed - From: {start}, To: {end}")
-            return {
-                'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
-                'is_event': is_event,
-                'is_lunar': is_lunar,
-                'is_solar': is_solar or (not is_lunar and not is_event)
-            }
 
-    if not is_fixed:
-        _LOGGER.debug(f"Local parse failed, trying to fix spelling for: {original_input}")
-        fixed_input = await fix_spelling(hass, original_input)
-        if fixed_input.lower() != original_input.lower():
-            _LOGGER.debug(f"Retrying parse with fixed input: {fixed_input}")
-            return await parse_input(hass, fixed_input, is_fixed=True)
-
-    _LOGGER.debug(f"Local parse failed after fix, falling back to Gemini for: {date_part}")
-    gemini_result = await parse_with_gemini(hass, date_part)
+def _finish_gemini_result(gemini_result, is_event, is_lunar, is_solar, data):
     gemini_result.update({
         'is_event': is_event,
         'is_lunar': is_lunar,
         'is_solar': is_solar or (not is_lunar and not is_event)
     })
     if 'date' in gemini_result and is_lunar:
-        solar_date = datetime.strptime(gemini_result['date'], '%Y-%m-%d').date()
-        day, month = solar_date.day, solar_date.month
-        lunar_date = f"{day:02d}/{month:02d}"
-        lunar_year = get_lunar_year(solar_date, _lunar_dates)
-        lunar_date_with_year = f"{lunar_date}/{lunar_year}"
-        _LOGGER.debug(f"Assuming solar date {solar_date} as lunar date: {lunar_date_with_year}")
-        if lunar_date in _solar_dates:
-            solar_dates = sorted(_solar_dates[lunar_date])
-            _LOGGER.debug(f"Solar dates for lunar {lunar_date}: {[d.strftime('%Y-%m-%d') for d in solar_dates]}")
-            selected_solar_date = min(solar_dates, key=lambda d: abs((datetime(lunar_year, month, day).date() - d).days))
-            _LOGGER.debug(f"Selected solar date: {selected_solar_date} for lunar {lunar_date_with_year}")
-            return {
-                'date': selected_solar_date.strftime('%Y-%m-%d'),
-                'is_event': is_event,
-                'is_lunar': True,
-                'is_solar': False,
-                'lunar_date': lunar_date_with_year
-            }
-        else:
-            _LOGGER.error(f"No solar dates found for lunar {lunar_date}")
-            return {'error': f'Không tìm thấy ngày âm lịch {lunar_date} trong dữ liệu ICS'}
+        # Ngày Gemini trả về là ngày âm lịch (có thể như 2026-02-30), không parse thành date
+        year, month, day = map(int, gemini_result['date'].split('-'))
+        return _resolve_lunar(day, month, year, is_event, data)
     return gemini_result
 
+def _understood_query(result):
+    """(phần ngày, is_event, is_lunar, is_solar) của câu Gemini đã sửa; không có từ khóa thì theo kind."""
+    date_part, *flags = _split_query(result['corrected'])
+    kind_flags = _QUERY_KINDS[result['kind']]
+    if not any(flags):
+        return (date_part, *kind_flags)
+    if not any(flag and kind_flag for flag, kind_flag in zip(flags, kind_flags)):
+        raise ValueError(f"kind '{result['kind']}' không khớp với câu đã sửa")
+    return (date_part, *flags)
+
+def _check_date(value, lunar=False):
+    """Ngày (năm, tháng, ngày) của chuỗi YYYY-MM-DD, ValueError nếu sai định dạng hoặc không tồn tại."""
+    match = _ISO_DATE.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError(f"Ngày không đúng định dạng YYYY-MM-DD: {value!r}")
+    year, month, day = map(int, match.groups())
+    if lunar:
+        # Ngày âm lịch có thể là 30/2; ngày có thật hay không do _resolve_lunar quyết định
+        if not (1 <= day <= 30 and 1 <= month <= 12):
+            raise ValueError(f"Ngày âm lịch không hợp lệ: {value}")
+    else:
+        date(year, month, day)
+    return year, month, day
+
+def _check_understood(result, input_text):
+    """Kiểm tra kết quả của understand_with_gemini, ném ValueError nếu không được tin dùng."""
+    if not isinstance(result, dict):
+        raise ValueError("Response không phải JSON object")
+    if not result.keys() <= _QUERY_FIELDS:
+        raise ValueError(f"Trường lạ: {sorted(result.keys() - _QUERY_FIELDS)}")
+    corrected = result.get('corrected')
+    if (not isinstance(corrected, str) or not corrected.strip() or '\n' in corrected
+            or len(corrected) > 2 * len(input_text) + 20):
+        raise ValueError("Câu sửa chính tả không hợp lệ")
+    if result.get('kind') not in _QUERY_KINDS:
+        raise ValueError(f"kind không hợp lệ: {result.get('kind')!r}")
+    answers = [field for field in ('date', 'range', 'error') if field in result]
+    if len(answers) != 1:
+        raise ValueError(f"Cần đúng một trong date, range, error, nhận được {answers}")
+    is_lunar = _understood_query(result)[2]
+    if 'date' in result:
+        _check_date(result['date'], lunar=is_lunar)
+    elif 'range' in result:
+        span = result['range']
+        if not isinstance(span, dict) or span.keys() != {'start', 'end'}:
+            raise ValueError("range phải gồm đúng start và end")
+        if _check_date(span['start']) > _check_date(span['end']):
+            raise ValueError("range có start sau end")
+    elif not isinstance(result['error'], str):
+        raise ValueError("error phải là chuỗi")
+
+def _finish_understood(result, data, trace=NULL_TRACE):
+    """Kết quả cuối từ understand_with_gemini: ưu tiên phân tích cục bộ câu đã sửa, sau đó mới dùng ngày Gemini."""
+    query = _understood_query(result)
+    corrected = result['corrected']
+    local = _parse_local(*query, data)
+    if local is None:
+        local = _parse_event_question(corrected, query[0], data)
+    if local is not None:
+        _LOGGER.debug("Phân tích cục bộ câu Gemini đã sửa: %s", corrected)
+        trace.resolved('spelling')
+        return local
+    trace.resolved('gemini')
+    answer = {field: result[field] for field in ('date', 'range', 'error') if field in result}
+    return _finish_gemini_result(answer, *query[1:], data)
+
+async def parse_input(hass: HomeAssistant, input_text, is_fixed=False, data=None, trace=NULL_TRACE):
+    _LOGGER.debug("Parsing input: %s, is_fixed=%s", input_text, is_fixed)
+    if data is None:
+        data = _data
+    original_input = input_text
+    date_part, is_event, is_lunar, is_solar = _split_query(input_text)
+    trace.mark('split')
+    result = _parse_local(date_part, is_event, is_lunar, is_solar, data)
+    trace.mark('grammar')
+    if result is None:
+        result = _parse_event_question(input_text, date_part, data)
+        trace.mark('event_search')
+    if result is not None:
+        trace.resolved('spelling' if is_fixed else 'local')
+        return result
+
+    if not is_fixed:
+        # Sửa lỗi gõ/thiếu dấu tại chỗ trước khi nhờ Gemini
+        result = _parse_corrected(original_input, data)
+        trace.mark('fuzzy')
+        if result is not None:
+            trace.resolved('fuzzy')
+            return result
+        if GEMINI_API_KEY:
+            # Một lần gọi vừa sửa chính tả vừa phân tích; response không hợp lệ thì gọi riêng hai bước
+            understood = await understand_with_gemini(hass, original_input)
+            trace.mark('gemini_structured')
+            if understood is not None and 'corrected' not in understood:
+                trace.resolved('gemini')
+                return _finish_gemini_result(understood, is_event, is_lunar, is_solar, data)
+            if understood is not None:
+                return _finish_understood(understood, data, trace)
+        _LOGGER.debug("Local parse failed, trying to fix spelling for: %s", original_input)
+        fixed_input = await fix_spelling(hass, original_input)
+        trace.mark('fix_spelling')
+        if fixed_input.lower() != original_input.lower():
+            _LOGGER.debug("Retrying parse with fixed input: %s", fixed_input)
+            return await parse_input(hass, fixed_input, is_fixed=True, data=data, trace=trace)
+
+    _LOGGER.debug("Local parse failed after fix, falling back to Gemini for: %s", date_part)
+    gemini_result = await parse_with_gemini(hass, date_part)
+    trace.mark('parse_with_gemini')
+    trace.resolved('gemini')
+    return _finish_gemini_result(gemini_result, is_event, is_lunar, is_solar, data)
+
+async def parse_inputs_batch(hass: HomeAssistant, input_texts, data=None):
+    """Phân tích nhiều câu truy vấn như parse_input, kết quả theo đúng thứ tự.
+
+    Câu trùng nhau chỉ phân tích một lần; các câu cần Gemini được gửi chung
+    một lần sửa chính tả và một lần phân tích. Câu nào lỗi thì phần tử tương
+    ứng là Exception.
+    """
+    if data is None:
+        data = _data
+    results = {}
+    pending = []
+    for text in dict.fromkeys(input_texts):
+        try:
+            query = _split_query(text)
+            result = _parse_local(*query, data)
+            if result is None:
+                result = _parse_event_question(text, query[0], data)
+            if result is None:
+                result = _parse_corrected(text, data)
+        except Exception as e:
+            result = e
+        if result is None:
+            pending.append(text)
+        else:
+            results[text] = result
+
+    if pending:
+        fixed_texts = await fix_spelling_batch(hass, pending)
+        remaining = []
+        for text, fixed_text in zip(pending, fixed_texts):
+            try:
+                query = _split_query(text)
+                if fixed_text.lower() != text.lower():
+                    _LOGGER.debug("Retrying parse with fixed input: %s", fixed_text)
+                    query = _split_query(fixed_text)
+                    result = _parse_local(*query, data)
+                    if result is None:
+                        result = _parse_event_question(fixed_text, query[0], data)
+                    if result is not None:
+                        results[text] = result
+                        continue
+                remaining.append((text, query))
+            except Exception as e:
+                results[text] = e
+        if remaining:
+            gemini_results = await parse_with_gemini_batch(hass, [query[0] for _, query in remaining])
+            for (text, query), gemini_result in zip(remaining, gemini_results):
+                try:
+                    results[text] = _finish_gemini_result(gemini_result, *query[1:], data)
+                except Exception as e:
+                    results[text] = e
+    return [results[text] for text in input_texts]
+
 async def generate_humorous_output(hass: HomeAssistant, original_output, use_humor=True):
     if not use_humor:
         return original_output
     if not GEMINI_API_KEY:
         _LOGGER.error("Không có Gemini API key được cấu hình")
         return original_output
-    headers = {
-        "Content-Type": "application/json",
-        "x-goog-api-key": GEMINI_API_KEY
-    }
+    cached = _humor_cache.get(original_output)
+    if cached is not None:
+        humorous_text, needs_refresh = cached
+        _LOGGER.debug("Cache output hài hước: %s", humorous_text)
+        if needs_refresh and original_output not in _humor_refreshing:
+            # Trả ngay biến thể có sẵn, lấy thêm biến thể mới từ Gemini ở nền
+            _humor_refreshing.add(original_output)
+            hass.async_create_background_task(
+                _refresh_humorous_output(hass, original_output), "amlich_humor_refresh"
+            )
+        return humorous_text
+    humorous_text = await _request_humorous_output(hass, original_output)
+    if humorous_text is None:
+        return original_output
+    _humor_cache.add(original_output, humorous_text)
+    return humorous_text
+
+async def _request_humorous_output(hass: HomeAssistant, original_output):
     prompt = f"""Hãy viết lại đoạn văn sau với giọng điệu hài hước, dí dỏm, nhưng giữ nguyên thông tin chính xác:
 '{original_output}'"""
-    
-    data = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }],
-        "generationConfig": {
-            "response_mime_type": "text/plain"
-        }
-    }
-    
-    def make_request():
-        try:
-            response = requests.post(GEMINI_API_URL, headers=headers, json=data)
-            if response.status_code == 200:
-                humorous_text = response.json()['candidates'][0]['content']['parts'][0]['text']
-                _LOGGER.debug(f"Humorous output generated: {humorous_text}")
-                return humorous_text
-            else:
-                _LOGGER.error(f"Lỗi Gemini API (hài hước): {response.status_code} - {response.text}")
-                return original_output
-        except Exception as e:
-            _LOGGER.error(f"Lỗi tạo output hài hước: {str(e)}")
-            return original_output
 
-    return await hass.async_add_executor_job(make_request)
+    try:
+        humorous_text = await get_gemini_client(hass).generate(prompt)
+        _LOGGER.debug("Humorous output generated: %s", humorous_text)
+        return humorous_text
+    except GeminiError as e:
+        _LOGGER.error("Lỗi tạo output hài hước: %s", e)
+        return None
 
-async def query_date(hass: HomeAssistant, query, use_humor=True):
-    global _lunar_dates, _solar_dates, _events
-    _LOGGER.debug(f"Querying date for: {query}, use_humor={use_humor}")
+async def _refresh_humorous_output(hass: HomeAssistant, original_output):
     try:
-        parsed = await parse_input(hass, query)
-        _LOGGER.debug(f"Parsed result: {parsed}")
-        if not parsed or 'error' in parsed:
-            original_output = parsed.get('error', "Không thể phân tích input. Vui lòng thử lại!")
-            _LOGGER.debug(f"Parse error: {original_output}")
-            return {"output": await generate_humorous_output(hass, original_output, use_humor)}
-
-        result = {}
-        is_event = parsed.get('is_event', False)
-        is_lunar = parsed.get('is_lunar', False)
-        is_solar = parsed.get('is_solar', False)
-        lunar_date = parsed.get('lunar_date', None)
-        _LOGGER.debug(f"is_event={is_event}, is_lunar={is_lunar}, is_solar={is_solar}, lunar_date={lunar_date}")
-
-        if 'date' in parsed and parsed['date']:
-            try:
-                date = datetime.strptime(parsed['date'], '%Y-%m-%d').date()
-                weekday = ['Thứ Hai', 'Thứ Ba', 'Thứ Tư', 'Thứ Năm', 'Thứ Sáu', 'Thứ Bảy', 'Chủ Nhật'][date.weekday()]
-                if is_lunar:
-                    _LOGGER.debug(f"Processing lunar date: {lunar_date} for solar {date}")
-                    if is_event:
-                        event_list = _events.get(date, [])
-                        _LOGGER.debug(f"Events for {date}: {event_list}")
-                        if event_list:
-                            events_str = ', '.join(event_list)
-                            original_output = f"Âm lịch ngày {lunar_date} tương ứng với dương lịch {date.strftime('%d/%m/%Y')} ({weekday}) có sự kiện: {events_str}!"
-                        else:
-                            original_output = f"Âm lịch ngày {lunar_date} tương ứng với dương lịch {date.strftime('%d/%m/%Y')} ({weekday}) không có sự kiện nào!"
+        humorous_text = await _request_humorous_output(hass, original_output)
+        if humorous_text is not None:
+            _humor_cache.add(original_output, humorous_text)
+    finally:
+        _humor_refreshing.discard(original_output)
+
+def _lunar_text(solar_date, data, memo=None):
+    if memo is not None and solar_date in memo:
+        return memo[solar_date]
+    lunar = get_lunar_date(solar_date, data.day_table)
+    text = f"{lunar.day:02d}/{lunar.month:02d}/{lunar.year}"
+    if memo is not None:
+        memo[solar_date] = text
+    return text
+
+async def _humor_stage(hass: HomeAssistant, original_output, use_humor, trace):
+    trace.mark('lookup')
+    output = await generate_humorous_output(hass, original_output, use_humor)
+    trace.mark('humor')
+    return output
+
+async def _build_result(hass: HomeAssistant, parsed, data, use_humor, lunar_memo=None, trace=NULL_TRACE):
+    """Dựng kết quả tra cứu (ngày âm lịch, sự kiện, câu trả lời) từ kết quả phân tích."""
+    if not parsed or 'error' in parsed:
+        original_output = parsed.get('error', "Không thể phân tích input. Vui lòng thử lại!")
+        _LOGGER.debug("Parse error: %s", original_output)
+        return {"output": await _humor_stage(hass, original_output, use_humor, trace)}
+
+    result = {}
+    is_event = parsed.get('is_event', False)
+    is_lunar = parsed.get('is_lunar', False)
+    is_solar = parsed.get('is_solar', False)
+    lunar_date = parsed.get('lunar_date', None)
+    _LOGGER.debug("is_event=%s, is_lunar=%s, is_solar=%s, lunar_date=%s", is_event, is_lunar, is_solar, lunar_date)
+
+    if 'date' in parsed and parsed['date']:
+        try:
+            date = datetime.strptime(parsed['date'], '%Y-%m-%d').date()
+            weekday = ['Thứ Hai', 'Thứ Ba', 'Thứ Tư', 'Thứ Năm', 'Thứ Sáu', 'Thứ Bảy', 'Chủ Nhật'][date.weekday()]
+            if parsed.get('event'):
+                name = parsed['event']
+                actual_lunar_date = _lunar_text(date, data, lunar_memo)
+                end = datetime.strptime(parsed.get('event_end') or parsed['date'], '%Y-%m-%d').date()
+                when = f"năm {parsed['event_year']}" if parsed.get('event_year') else "lần tới"
+                original_output = f"{name} {when} là {weekday} ngày {date.strftime('%d/%m/%Y')} (âm lịch {actual_lunar_date})"
+                if end > date:
+                    original_output += f", kéo dài đến ngày {end.strftime('%d/%m/%Y')}"
+                original_output += "!"
+                _LOGGER.debug("Output for event: %s", original_output)
+                result = {
+                    'date': date.strftime('%Y-%m-%d'),
+                    'lunar_date': actual_lunar_date,
+                    'event': name,
+                    'events': data.index.on(date),
+                    'is_lunar': False,
+                    'is_solar': False,
+                    'is_event': True,
+                    'output': await _humor_stage(hass, original_output, use_humor, trace)
+                }
+            elif is_lunar:
+                _LOGGER.debug("Processing lunar date: %s for solar %s", lunar_date, date)
+                if is_event:
+                    event_list = data.index.on(date)
+                    _LOGGER.debug("Events for %s: %s", date, event_list)
+                    if event_list:
+                        events_str = ', '.join(event_list)
+                        original_output = f"Âm lịch ngày {lunar_date} tương ứng với dương lịch {date.strftime('%d/%m/%Y')} ({weekday}) có sự kiện: {events_str}!"
                     else:
-                        original_output = f"Âm lịch ngày {lunar_date} tương ứng với dương lịch {date.strftime('%d/%m/%Y')} ({weekday})!"
-                    _LOGGER.debug(f"Output for lunar date: {original_output}")
-                    result = {
-                        'date': date.strftime('%Y-%m-%d'),
-                        'lunar_date': lunar_date,
-                        'events': _events.get(date, []),
-                        'is_lunar': True,
-                        'is_solar': False,
-                        'is_event': is_event,
-                        'output': await generate_humorous_output(hass, original_output, use_humor)
-                    }
+                        original_output = f"Âm lịch ngày {lunar_date} tương ứng với dương lịch {date.strftime('%d/%m/%Y')} ({weekday}) không có sự kiện nào!"
                 else:
-                    actual_lunar_date = _lunar_dates.get(date, 'Không có dữ liệu âm lịch')
-                    if actual_lunar_date != 'Không có dữ liệu âm lịch':
-                        try:
-                            day, month = map(int, actual_lunar_date.split('/'))
-                            lunar_year = get_lunar_year(date, _lunar_dates)
-                            actual_lunar_date = f"{day:02d}/{month:02d}/{lunar_year}"
-                        except ValueError:
-                            _LOGGER.error(f"Invalid lunar date format: {actual_lunar_date}")
-                            actual_lunar_date = 'Dữ liệu âm lịch không hợp lệ'
-                    _LOGGER.debug(f"Processing solar date: {date}, lunar: {actual_lunar_date}")
-                    if is_event:
-                        event_list = _events.get(date, [])
-                        _LOGGER.debug(f"Events for {date}: {event_list}")
-                        if event_list:
-                            events_str = ', '.join(event_list)
-                            original_output = f"Dương lịch ngày {date.strftime('%d/%m/%Y')} ({weekday}) có sự kiện: {events_str} (âm lịch {actual_lunar_date})!"
-                        else:
-                            original_output = f"Dương lịch ngày {date.strftime('%d/%m/%Y')} ({weekday}) không có sự kiện nào!"
+                    original_output = f"Âm lịch ngày {lunar_date} tương ứng với dương lịch {date.strftime('%d/%m/%Y')} ({weekday})!"
+                _LOGGER.debug("Output for lunar date: %s", original_output)
+                result = {
+                    'date': date.strftime('%Y-%m-%d'),
+                    'lunar_date': lunar_date,
+                    'events': data.index.on(date),
+                    'is_lunar': True,
+                    'is_solar': False,
+                    'is_event': is_event,
+                    'output': await _humor_stage(hass, original_output, use_humor, trace)
+                }
+            else:
+                actual_lunar_date = _lunar_text(date, data, lunar_memo)
+                _LOGGER.debug("Processing solar date: %s, lunar: %s", date, actual_lunar_date)
+                if is_event:
+                    event_list = data.index.on(date)
+                    _LOGGER.debug("Events for %s: %s", date, event_list)
+                    if event_list:
+                        events_str = ', '.join(event_list)
+                        original_output = f"Dương lịch ngày {date.strftime('%d/%m/%Y')} ({weekday}) có sự kiện: {events_str} (âm lịch {actual_lunar_date})!"
                     else:
-                        original_output = f"Dương lịch ngày {date.strftime('%d/%m/%Y')} ({weekday}) là ngày {actual_lunar_date} âm lịch!"
-                    _LOGGER.debug(f"Output for solar date: {original_output}")
-                    result = {
-                        'date': date.strftime('%Y-%m-%d'),
-                        'lunar_date': actual_lunar_date,
-                        'events': _events.get(date, []),
-                        'is_lunar': False,
-                        'is_solar': is_solar or (not is_lunar and not is_event),
-                        'is_event': is_event,
-                        'output': await generate_humorous_output(hass, original_output, use_humor)
-                    }
-            except (ValueError, TypeError) as e:
-                _LOGGER.debug(f"Error processing date: {e}")
-                original_output = "Ngày không hợp lệ. Vui lòng kiểm tra lại!"
-                return {"output": await generate_humorous_output(hass, original_output, use_humor)}
-        elif 'range' in parsed:
-            start = datetime.strptime(parsed['range']['start'], '%Y-%m-%d').date()
-            end = datetime.strptime(parsed['range']['end'], '%Y-%m-%d').date()
-            _LOGGER.debug(f"Processing range: {start} to {end}")
-            event_list = []
-            for d in (start + timedelta(n) for n in range((end - start).days + 1)):
-                if d in _events:
-                    for evt in _events[d]:
-                        actual_lunar_date = _lunar_dates.get(d, 'Không có dữ liệu âm lịch')
-                        if actual_lunar_date != 'Không có dữ liệu âm lịch':
-                            try:
-                                day, month = map(int, actual_lunar_date.split('/'))
-                                lunar_year = get_lunar_year(d, _lunar_dates)
-                                actual_lunar_date = f"{day:02d}/{month:02d}/{lunar_year}"
-                            except ValueError:
-                                _LOGGER.error(f"Invalid lunar date format: {actual_lunar_date}")
-                                actual_lunar_date = 'Dữ liệu âm lịch không hợp lệ'
-                        event_list.append(f"Ngày {d.strftime('%d/%m/%Y')} ({actual_lunar_date} âm lịch) là {evt}")
-                        _LOGGER.debug(f"Event found for {d}: {evt}")
-            if is_event:
-                if event_list:
-                    original_output = f"Trong khoảng từ {start.strftime('%d/%m/%Y')} đến {end.strftime('%d/%m/%Y')} có {len(event_list)} sự kiện:\n" + '\n'.join(event_list)
+                        original_output = f"Dương lịch ngày {date.strftime('%d/%m/%Y')} ({weekday}) không có sự kiện nào!"
                 else:
-                    original_output = f"Trong khoảng từ {start.strftime('%d/%m/%Y')} đến {end.strftime('%d/%m/%Y')} không có sự kiện nào!"
+                    original_output = f"Dương lịch ngày {date.strftime('%d/%m/%Y')} ({weekday}) là ngày {actual_lunar_date} âm lịch!"
+                _LOGGER.debug("Output for solar date: %s", original_output)
+                result = {
+                    'date': date.strftime('%Y-%m-%d'),
+                    'lunar_date': actual_lunar_date,
+                    'events': data.index.on(date),
+                    'is_lunar': False,
+                    'is_solar': is_solar or (not is_lunar and not is_event),
+                    'is_event': is_event,
+                    'output': await _humor_stage(hass, original_output, use_humor, trace)
+                }
+        except (ValueError, TypeError) as e:
+            _LOGGER.debug("Error processing date: %s", e)
+            original_output = "Ngày không hợp lệ. Vui lòng kiểm tra lại!"
+            return {"output": await _humor_stage(hass, original_output, use_humor, trace)}
+    elif 'range' in parsed:
+        start = datetime.strptime(parsed['range']['start'], '%Y-%m-%d').date()
+        end = datetime.strptime(parsed['range']['end'], '%Y-%m-%d').date()
+        _LOGGER.debug("Processing range: %s to %s", start, end)
+        event_list = []
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        for d, evt, last in data.index.between(start, end):
+            actual_lunar_date = _lunar_text(d, data, lunar_memo)
+            if last > d:
+                evt = f"{evt} (đến ngày {last.strftime('%d/%m/%Y')})"
+            event_list.append(f"Ngày {d.strftime('%d/%m/%Y')} ({actual_lunar_date} âm lịch) là {evt}")
+            if debug:
+                _LOGGER.debug("Event found for %s: %s", d, evt)
+        if is_event:
+            if event_list:
+                original_output = f"Trong khoảng từ {start.strftime('%d/%m/%Y')} đến {end.strftime('%d/%m/%Y')} có {len(event_list)} sự kiện:\n" + '\n'.join(event_list)
             else:
-                original_output = "Vui lòng chỉ định ngày cụ thể để tra cứu âm lịch hoặc dương lịch!"
-            _LOGGER.debug(f"Output for range: {original_output}")
-            result = {
-                'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
-                'events': event_list,
-                'is_lunar': is_lunar,
-                'is_solar': is_solar or (not is_lunar and not is_event),
-                'is_event': is_event,
-                'output': await generate_humorous_output(hass, original_output, use_humor)
-            }
-        _LOGGER.debug(f"Final result: {result}")
-        return result
+                original_output = f"Trong khoảng từ {start.strftime('%d/%m/%Y')} đến {end.strftime('%d/%m/%Y')} không có sự kiện nào!"
+        else:
+            original_output = "Vui lòng chỉ định ngày cụ thể để tra cứu âm lịch hoặc dương lịch!"
+        _LOGGER.debug("Output for range: %s", original_output)
+        result = {
+            'range': {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')},
+            'events': event_list,
+            'is_lunar': is_lunar,
+            'is_solar': is_solar or (not is_lunar and not is_event),
+            'is_event': is_event,
+            'output': await _humor_stage(hass, original_output, use_humor, trace)
+        }
+    _LOGGER.debug("Final result: %s", result)
+    return result
+
+async def query_date(hass: HomeAssistant, query, use_humor=True):
+    _LOGGER.debug("Querying date for: %s, use_humor=%s", query, use_humor)
+    # Lấy ảnh chụp dữ liệu một lần, tải lại ICS giữa chừng không ảnh hưởng truy vấn này
+    data = _data
+    trace = start_trace(_LOGGER, 'query_date', query, _query_stats)
+    try:
+        parsed = await parse_input(hass, query, data=data, trace=trace)
+        _LOGGER.debug("Parsed result: %s", parsed)
+        return await _build_result(hass, parsed, data, use_humor, trace=trace)
     except Exception as e:
-        _LOGGER.debug(f"Lỗi trong query_date: {str(e)}")
-        return {"output": f"Lỗi xử lý: {str(e)}"}
\ No newline at end of file
+        _LOGGER.debug("Lỗi trong query_date: %s", e)
+        trace.resolved('error')
+        return {"output": f"Lỗi xử lý: {str(e)}"}
+    finally:
+        trace.finish()
+
+async def query_dates_batch(hass: HomeAssistant, queries, use_humor=False):
+    """Tra cứu nhiều câu truy vấn hoặc ngày dương lịch (date) cùng lúc.
+
+    Trả về danh sách kết quả giống query_date theo đúng thứ tự. Các câu cần
+    Gemini được gửi chung, kết quả phân tích trùng nhau chỉ dựng một lần và
+    ngày âm lịch được tra một lần cho cả lô.
+    """
+    _LOGGER.debug("Querying %s dates, use_humor=%s", len(queries), use_humor)
+    data = _data
+    trace = start_trace(_LOGGER, 'query_dates_batch', len(queries))
+    texts = [query for query in queries if not isinstance(query, date)]
+    try:
+        parsed_texts = iter(await parse_inputs_batch(hass, texts, data=data))
+        trace.mark('parse')
+    except Exception as e:
+        _LOGGER.debug("Lỗi trong query_dates_batch: %s", e)
+        return [{"output": f"Lỗi xử lý: {str(e)}"} for _ in queries]
+    parsed_list = []
+    for query in queries:
+        if isinstance(query, date):
+            solar_date = query.date() if isinstance(query, datetime) else query
+            parsed_list.append({'date': solar_date.strftime('%Y-%m-%d'), 'is_event': False,
+                                'is_lunar': False, 'is_solar': True})
+        else:
+            parsed_list.append(next(parsed_texts))
+
+    def batch_key(parsed):
+        if isinstance(parsed, Exception):
+            return f"exception:{id(parsed)}"
+        return json.dumps(parsed, sort_keys=True, default=str)
+
+    async def build(parsed):
+        if isinstance(parsed, Exception):
+            return {"output": f"Lỗi xử lý: {str(parsed)}"}
+        try:
+            return await _build_result(hass, parsed, data, use_humor, lunar_memo)
+        except Exception as e:
+            _LOGGER.debug("Lỗi trong query_dates_batch: %s", e)
+            return {"output": f"Lỗi xử lý: {str(e)}"}
+
+    lunar_memo = {}
+    unique = {}
+    for parsed in parsed_list:
+        unique.setdefault(batch_key(parsed), parsed)
+    built = dict(zip(unique, await asyncio.gather(*(build(parsed) for parsed in unique.values()))))
+    trace.mark('build')
+    trace.finish(f"{len(unique)} kết quả khác nhau")
+    return [dict(built[batch_key(parsed)]) for parsed in parsed_list]
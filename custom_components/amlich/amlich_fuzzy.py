@@ -0,0 +1,135 @@
+"""Sửa lỗi gõ phím trong câu truy vấn ngày mà không cần gọi Gemini.
+
+Mỗi từ được bỏ dấu, gộp các chữ cái lặp ('tuaann' → 'tuan') rồi so với bộ từ
+khóa của cú pháp ngày, chấp nhận sai lệch nhỏ theo khoảng cách chỉnh sửa
+(thêm, bớt, thay hoặc đảo hai chữ cạnh nhau). Dấu được khôi phục theo cụm từ
+để phân biệt 'tuần này'/'hôm nay', 'thứ sáu'/'tuần sau'.
+"""
+import re
+import unicodedata
+
+# Cụm từ có dấu. Khi nhiều cụm trùng nhau sau khi bỏ dấu, chọn cụm khớp nhiều từ
+# người dùng gõ nhất, nếu ngang nhau thì chọn cụm đứng trước ('thang sau' → 'tháng sau').
+PHRASES = [
+    'ngày hôm nay', 'ngày này tuần sau', 'ngày này tháng sau', 'hôm nay tuần sau',
+    'hôm nay', 'hôm qua', 'hôm kia', 'hôm sau', 'ngày này', 'ngày mai', 'ngày kia', 'ngày mốt',
+    'tuần này', 'tuần trước', 'tuần sau', 'tuần tới', 'tháng này', 'tháng sau', 'tháng tới',
+    'thứ hai', 'thứ ba', 'thứ tư', 'thứ năm', 'thứ sáu', 'thứ bảy', 'chủ nhật',
+    'tháng một', 'tháng hai', 'tháng ba', 'tháng bốn', 'tháng tư', 'tháng năm', 'tháng sáu',
+    'tháng bảy', 'tháng tám', 'tháng chín', 'tháng mười một', 'tháng mười hai', 'tháng mười',
+    'âm lịch', 'dương lịch', 'sự kiện',
+]
+
+# Từ đơn có dấu, dùng khi từ không nằm trong cụm nào ở trên
+WORDS = [
+    'ngày', 'tuần', 'tháng', 'năm', 'thứ', 'hôm', 'này', 'sau', 'tới', 'trước', 'mai', 'kia', 'qua',
+    'một', 'hai', 'ba', 'bốn', 'tư', 'sáu', 'bảy', 'tám', 'chín', 'mười',
+    'chủ', 'nhật', 'âm', 'dương', 'lịch', 'sự', 'kiện',
+]
+
+_MAX_PHRASE_WORDS = max(len(phrase.split()) for phrase in PHRASES)
+_REPEATED = re.compile(r'([a-z])\1+')
+_ALPHA = re.compile(r'^[^\W\d_]+$')
+
+
+def fold(text):
+    """Bỏ dấu tiếng Việt: 'Dương lịch' → 'duong lich'."""
+    decomposed = unicodedata.normalize('NFD', text.lower().replace('đ', 'd').replace('Đ', 'd'))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _key(word):
+    return _REPEATED.sub(r'\1', fold(word))
+
+
+def _build_table(entries):
+    table = {}
+    for entry in entries:
+        table.setdefault(' '.join(_key(word) for word in entry.split()), []).append(entry.split())
+    return table
+
+
+def _closest(candidates, typed):
+    """Cụm có dấu trùng với nhiều từ đã gõ nhất."""
+    return ' '.join(max(candidates, key=lambda words: sum(a == b for a, b in zip(words, typed))))
+
+
+_PHRASE_TABLE = _build_table(PHRASES)
+_WORD_TABLE = _build_table(WORDS)
+_VOCABULARY = sorted({key for table in (_PHRASE_TABLE, _WORD_TABLE) for entry in table for key in entry.split()})
+_VOCABULARY_SET = frozenset(_VOCABULARY)
+
+
+def edit_distance(a, b, limit):
+    """Khoảng cách Damerau-Levenshtein (đảo chữ cạnh nhau tính 1), dừng sớm khi vượt limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _max_edits(word):
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) < 7 else 2
+
+
+def _correct_word(key):
+    """Từ khóa (không dấu) gần nhất với key, hoặc None nếu không có hoặc có nhiều từ cách đều.
+
+    Từ 3 chữ chỉ được sửa bằng cách thêm một chữ ('lch' → 'lich'); khi hai từ khóa
+    cách đều, ưu tiên từ cùng độ dài (đảo chữ 'nagy' → 'ngay' thay vì 'nay').
+    """
+    if key in _VOCABULARY_SET:
+        return key
+    limit = _max_edits(key)
+    if not limit:
+        return None
+    best = None
+    best_score = (limit + 1, False)
+    for candidate in _VOCABULARY:
+        if len(key) < 4 and len(candidate) <= len(key):
+            continue
+        score = (edit_distance(key, candidate, limit), len(candidate) != len(key))
+        if score < best_score:
+            best, best_score = candidate, score
+        elif score == best_score:
+            best = None
+    return best if best_score[0] <= limit else None
+
+
+def correct_query(text):
+    """Sửa các từ khóa gõ sai/không dấu trong câu truy vấn, giữ nguyên số và các từ không nhận ra."""
+    words = text.lower().split()
+    keys = []
+    for word in words:
+        keys.append(_correct_word(_key(word)) if _ALPHA.match(word) else None)
+    result = []
+    i = 0
+    while i < len(words):
+        for size in range(min(_MAX_PHRASE_WORDS, len(words) - i), 0, -1):
+            window = keys[i:i + size]
+            if None in window:
+                continue
+            candidates = _PHRASE_TABLE.get(' '.join(window))
+            if candidates is None and size == 1:
+                candidates = _WORD_TABLE.get(window[0])
+            if candidates is not None:
+                result.append(_closest(candidates, words[i:i + size]))
+                i += size
+                break
+        else:
+            result.append(words[i])
+            i += 1
+    return ' '.join(result)
@@ -0,0 +1,130 @@
+"""Client Gemini bất đồng bộ dùng chung session aiohttp của Home Assistant.
+
+Mọi lệnh gọi Gemini đi qua một GeminiClient: dùng lại kết nối keep-alive của
+session chung, giới hạn thời gian mỗi lần gọi, giới hạn số lệnh gọi đồng thời
+và thử lại với thời gian chờ tăng dần có nhiễu ngẫu nhiên khi lỗi tạm thời.
+
+aiohttp chỉ được import khi gọi Gemini để GeminiError có thể import ở mọi nơi
+mà không kéo theo aiohttp.
+"""
+import asyncio
+import logging
+import random
+import time
+
+from .amlich_stats import RollingPercentiles
+
+_LOGGER = logging.getLogger(__name__)
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 4.0
+
+# Mã lỗi HTTP tạm thời, nên thử lại
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class GeminiError(Exception):
+    """Lỗi khi gọi Gemini API. status là mã HTTP nếu có."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class GeminiClient:
+    """Client gọi Gemini generateContent."""
+
+    def __init__(self, session, api_key, url=GEMINI_API_URL, timeout=DEFAULT_TIMEOUT,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES):
+        self._session = session
+        self._api_key = api_key
+        self._url = url
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Số lần gọi generate, số lần gửi HTTP (kể cả thử lại), số lần thử lại và số lần thất bại
+        self.calls = 0
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.latency = RollingPercentiles()
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'latency_ms': self.latency.summary()
+        }
+
+    async def generate(self, prompt, response_mime_type="text/plain", timeout=None, response_schema=None):
+        """Gửi prompt và trả về văn bản của candidate đầu tiên, ném GeminiError nếu thất bại.
+
+        response_schema (dạng schema OpenAPI của Gemini) buộc response JSON theo cấu trúc cho trước.
+        """
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            return await self._generate(prompt, response_mime_type, timeout, response_schema)
+        except GeminiError:
+            self.errors += 1
+            raise
+        finally:
+            self.latency.add(time.perf_counter() - started)
+
+    async def _generate(self, prompt, response_mime_type, timeout, response_schema):
+        import aiohttp
+
+        data = {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }],
+            "generationConfig": {
+                "response_mime_type": response_mime_type
+            }
+        }
+        if response_schema is not None:
+            data["generationConfig"]["response_schema"] = response_schema
+        headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": self._api_key
+        }
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self._timeout)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    return await self._post(data, headers, client_timeout)
+            except GeminiError as e:
+                if e.status not in RETRY_STATUSES or attempt >= self._max_retries:
+                    raise
+                error = e
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                if attempt >= self._max_retries:
+                    raise GeminiError(f"Lỗi kết nối Gemini API: {str(e) or type(e).__name__}") from e
+                error = e
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            attempt += 1
+            self.retries += 1
+            _LOGGER.debug("Gemini lỗi tạm thời (%s), thử lại lần %s sau %.2fs",
+                          str(error) or type(error).__name__, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def _post(self, data, headers, client_timeout):
+        self.requests += 1
+        async with self._session.post(self._url, json=data, headers=headers, timeout=client_timeout) as response:
+            _LOGGER.debug("Status code từ Gemini API: %s", response.status)
+            if response.status != 200:
+                text = await response.text()
+                raise GeminiError(f"Lỗi khi gọi Gemini API: {response.status} - {text[:200]}", response.status)
+            response_json = await response.json(content_type=None)
+        try:
+            return response_json['candidates'][0]['content']['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            raise GeminiError("Response từ Gemini AI không hợp lệ")
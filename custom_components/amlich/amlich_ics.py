@@ -0,0 +1,333 @@
+"""Đọc file ICS và snapshot nhị phân của dữ liệu đã phân tích.
+
+File ICS được đọc tuần tự theo từng khối bằng một bộ phân tích dòng đơn
+giản, chỉ lấy DTSTART, DTEND/DURATION, SUMMARY, UID và SEQUENCE của các
+VEVENT; cấu trúc nào không hiểu sẽ chuyển sang icalendar.
+
+Snapshot được ghi cạnh file ICS (amlich.ics.snapshot) và gắn với mtime,
+kích thước và SHA-256 của file. Khi khóa khớp, bảng âm lịch được ánh xạ bộ
+nhớ (mmap) trực tiếp từ snapshot, còn danh sách sự kiện được lưu dạng JSON
+(chỉ dữ liệu, không thực thi mã khi đọc), không cần phân tích lại file ICS.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+
+from .amlich_lunar import LunarDayTable
+
+_LOGGER = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# end: ngày cuối cùng (tính cả) của sự kiện, bằng start với sự kiện một ngày
+IcsEvent = namedtuple('IcsEvent', ['start', 'summary', 'uid', 'sequence', 'end'], defaults=(None, 0, None))
+
+
+class UnsupportedIcsError(ValueError):
+    """File ICS có cấu trúc mà bộ phân tích dòng không hỗ trợ."""
+
+
+_DATE_VALUE = re.compile(r'^(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})Z?)?$')
+_DURATION = re.compile(r'^\+?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+_UNESCAPE = re.compile(r'\\([\\;,nN])')
+
+
+def _iter_unfolded_lines(f, chunk_size):
+    """Các dòng logic của file ICS (đã nối các dòng gấp theo RFC 5545)."""
+    pending = ''
+    current = None
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            line = line.rstrip('\r')
+            if line[:1] in (' ', '\t'):
+                if current is None:
+                    raise UnsupportedIcsError("Dòng gấp không có dòng trước")
+                current += line[1:]
+                continue
+            if current:
+                yield current
+            current = line
+    pending = pending.rstrip('\r')
+    if pending[:1] in (' ', '\t') and current is not None:
+        current += pending[1:]
+    else:
+        if current:
+            yield current
+        current = pending
+    if current:
+        yield current
+
+
+def _split_property(line):
+    """Tách dòng 'NAME;PARAM=...:VALUE' thành (NAME, {PARAM: value}, VALUE)."""
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            break
+    else:
+        raise UnsupportedIcsError(f"Dòng ICS không hợp lệ: {line[:50]}")
+    name, *raw_params = line[:index].split(';')
+    params = {}
+    for raw in raw_params:
+        key, _, value = raw.partition('=')
+        params[key.upper()] = value.strip('"')
+    return name.upper(), params, line[index + 1:]
+
+
+def _parse_datetime(name, value, params):
+    """Giá trị DATE/DATE-TIME dạng datetime (bỏ qua múi giờ)."""
+    if params.get('VALUE', 'DATE').upper() not in ('DATE', 'DATE-TIME'):
+        raise UnsupportedIcsError(f"{name} kiểu {params['VALUE']} không được hỗ trợ")
+    match = _DATE_VALUE.match(value.strip())
+    if not match:
+        raise UnsupportedIcsError(f"{name} không hợp lệ: {value}")
+    return datetime(*(int(part) for part in match.groups() if part is not None))
+
+
+def _parse_duration(value):
+    match = _DURATION.match(value.strip())
+    if not match or not any(match.groups()):
+        raise UnsupportedIcsError(f"DURATION không hợp lệ: {value}")
+    weeks, days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def last_day(start, end):
+    """Ngày cuối cùng (tính cả) của sự kiện kéo dài từ start đến trước end (RFC 5545)."""
+    if end is None or end <= start:
+        return start.date()
+    return (end - timedelta(microseconds=1)).date()
+
+
+def _unescape(value):
+    return _UNESCAPE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def iter_events(file_path, chunk_size=CHUNK_SIZE):
+    """Đọc tuần tự file ICS, trả về IcsEvent(start, summary, uid, sequence, end) cho từng VEVENT.
+
+    Chỉ giữ trong bộ nhớ một khối dữ liệu và VEVENT đang đọc. Gặp cấu trúc
+    không hỗ trợ sẽ ném UnsupportedIcsError để chuyển sang icalendar.
+    """
+    stack = []
+    start = end = duration = summary = uid = None
+    sequence = 0
+    seen_content = False
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        for line in _iter_unfolded_lines(f, chunk_size):
+            seen_content = True
+            name, params, value = _split_property(line)
+            if name == 'BEGIN':
+                stack.append(value.upper())
+                if stack[-1] == 'VEVENT':
+                    start = end = duration = summary = uid = None
+                    sequence = 0
+            elif name == 'END':
+                if not stack or stack[-1] != value.upper():
+                    raise UnsupportedIcsError(f"END:{value} không khớp với BEGIN")
+                if stack.pop() == 'VEVENT':
+                    if start is None or summary is None:
+                        _LOGGER.warning("Bỏ qua VEVENT thiếu DTSTART hoặc SUMMARY (DTSTART=%s)",
+                                        start and start.date())
+                    else:
+                        if end is None and duration is not None:
+                            end = start + duration
+                        yield IcsEvent(start.date(), summary, uid, sequence, last_day(start, end))
+            elif stack and stack[-1] == 'VEVENT':
+                if name == 'DTSTART':
+                    start = _parse_datetime(name, value, params)
+                elif name == 'DTEND':
+                    end = _parse_datetime(name, value, params)
+                elif name == 'DURATION':
+                    duration = _parse_duration(value)
+                elif name == 'SUMMARY':
+                    if 'ENCODING' in params:
+                        raise UnsupportedIcsError(f"SUMMARY mã hóa {params['ENCODING']} không được hỗ trợ")
+                    summary = _unescape(value)
+                elif name == 'UID':
+                    uid = value
+                elif name == 'SEQUENCE':
+                    try:
+                        sequence = int(value)
+                    except ValueError:
+                        raise UnsupportedIcsError(f"SEQUENCE không hợp lệ: {value}")
+    if not seen_content:
+        raise ValueError("File ICS rỗng")
+    if stack:
+        raise UnsupportedIcsError(f"Thiếu END cho {stack[-1]}")
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime(value.year, value.month, value.day)
+
+
+def iter_events_icalendar(file_path):
+    """Đọc file ICS bằng icalendar (dựng toàn bộ cây đối tượng), dùng khi bộ phân tích dòng không hỗ trợ."""
+    from icalendar import Calendar
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        ics_content = f.read()
+    if not ics_content.strip():
+        raise ValueError("File ICS rỗng")
+    cal = Calendar.from_ical(ics_content)
+    for event in cal.walk('VEVENT'):
+        if event.get('DTSTART') is None or event.get('SUMMARY') is None:
+            _LOGGER.warning("Bỏ qua VEVENT thiếu DTSTART hoặc SUMMARY")
+            continue
+        start = _as_datetime(event.get('DTSTART').dt)
+        end = None
+        if event.get('DTEND') is not None:
+            end = _as_datetime(event.get('DTEND').dt)
+        elif event.get('DURATION') is not None:
+            end = start + event.get('DURATION').dt
+        uid = event.get('UID')
+        yield IcsEvent(start.date(), str(event.get('SUMMARY')),
+                       str(uid) if uid is not None else None, int(event.get('SEQUENCE', 0)), last_day(start, end))
+
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_VERSION = 4
+
+_MAGIC = b"AMLICHSN"
+# magic, phiên bản, mtime_ns, kích thước, sha256, năm đầu/cuối của bảng âm lịch,
+# độ dài (bytes) các phần: ngày, mã tháng, ngày đầu tháng, sự kiện (JSON)
+_HEADER = struct.Struct("<8sHqq32shhQQQQ")
+_ALIGN = 8
+
+
+def _padded(length):
+    return (length + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def snapshot_path(file_path):
+    return file_path + SNAPSHOT_SUFFIX
+
+
+def _encode_payload(payload):
+    # Ngày lưu dạng số thứ tự (date.toordinal) để JSON chỉ chứa số và chuỗi
+    data = {
+        'events': [[day.toordinal(), summaries] for day, summaries in payload['events'].items()],
+        'records': [[key, sequence, content_hash, start.toordinal(), summary, end.toordinal()]
+                    for key, (sequence, content_hash, start, summary, end) in payload['records'].items()],
+    }
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _decode_payload(raw):
+    data = json.loads(raw)
+    days = {}
+
+    def day(ordinal):
+        # Nhiều sự kiện chung ngày, dùng lại cùng một đối tượng date
+        value = days.get(ordinal)
+        if value is None:
+            value = days[ordinal] = date.fromordinal(ordinal)
+        return value
+
+    events = {}
+    for ordinal, summaries in data['events']:
+        if not isinstance(summaries, list) or not all(isinstance(summary, str) for summary in summaries):
+            raise ValueError("danh sách sự kiện sai kiểu")
+        events[day(ordinal)] = summaries
+    records = {}
+    for key, sequence, content_hash, start, summary, end in data['records']:
+        if not (isinstance(key, str) and isinstance(sequence, int)
+                and isinstance(content_hash, str) and isinstance(summary, str)):
+            raise ValueError("bản ghi sự kiện sai kiểu")
+        records[key] = (sequence, content_hash, day(start), summary, day(end))
+    return {'events': events, 'records': records}
+
+
+def file_key(file_path):
+    """Khóa của file ICS: (mtime_ns, kích thước, SHA-256 nội dung)."""
+    stat = os.stat(file_path)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return stat.st_mtime_ns, stat.st_size, digest.digest()
+
+
+def load_snapshot(file_path, key, start_year, end_year):
+    """Trả về (payload, LunarDayTable) nếu snapshot hợp lệ, ngược lại None."""
+    path = snapshot_path(file_path)
+    try:
+        with open(path, 'rb') as f:
+            # Snapshot do tiến trình khác (người dùng khác) ghi thì bỏ qua, sẽ ghi lại
+            if hasattr(os, 'getuid') and os.fstat(f.fileno()).st_uid != os.getuid():
+                _LOGGER.debug("Snapshot %s không thuộc người dùng hiện tại, bỏ qua", path)
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if len(mapped) < _HEADER.size:
+            raise ValueError("snapshot quá ngắn")
+        (magic, version, mtime_ns, size, digest, table_start, table_end,
+         days_len, keys_len, starts_len, payload_len) = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC or version != SNAPSHOT_VERSION:
+            _LOGGER.debug("Snapshot %s khác phiên bản, bỏ qua", path)
+            mapped.close()
+            return None
+        if (mtime_ns, size, digest) != key or (table_start, table_end) != (start_year, end_year):
+            _LOGGER.debug("Snapshot %s không khớp với file ICS hiện tại", path)
+            mapped.close()
+            return None
+        view = memoryview(mapped)
+        offset = _padded(_HEADER.size)
+        buffers = []
+        for length, fmt in ((days_len, 'I'), (keys_len, 'I'), (starts_len, 'i')):
+            buffers.append(view[offset:offset + length].cast(fmt))
+            offset += _padded(length)
+        payload = _decode_payload(bytes(view[offset:offset + payload_len]))
+        table = LunarDayTable.from_buffers(start_year, end_year, *buffers)
+        # mmap được giữ mở bởi các memoryview của bảng âm lịch
+        return payload, table
+    except Exception as e:
+        _LOGGER.warning("Snapshot %s bị hỏng, sẽ phân tích lại file ICS: %s", path, e)
+        try:
+            mapped.close()
+        except BufferError:
+            pass
+        return None
+
+
+def save_snapshot(file_path, key, payload, table):
+    """Ghi snapshot (ghi file tạm rồi đổi tên) để lần tải sau không phải phân tích lại."""
+    path = snapshot_path(file_path)
+    mtime_ns, size, digest = key
+    sections = [bytes(buffer) for buffer in table.buffers()]
+    sections.append(_encode_payload(payload))
+    header = _HEADER.pack(_MAGIC, SNAPSHOT_VERSION, mtime_ns, size, digest,
+                          table.start_year, table.end_year, *(len(s) for s in sections))
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header.ljust(_padded(len(header)), b'\0'))
+            for section in sections:
+                f.write(section.ljust(_padded(len(section)), b'\0'))
+        os.replace(tmp_path, path)
+        _LOGGER.debug("Đã ghi snapshot %s", path)
+        return True
+    except OSError as e:
+        _LOGGER.warning("Không thể ghi snapshot %s: %s", path, e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,231 @@
+"""Chỉ mục sự kiện theo ngày cho các truy vấn khoảng thời gian.
+
+Sự kiện một ngày nằm trong mảng ngày (ordinal) đã sắp xếp, truy vấn khoảng chỉ
+cần hai lần tìm kiếm nhị phân rồi cắt mảng, chi phí tỉ lệ với số sự kiện tìm
+được chứ không phải số ngày của khoảng. Sự kiện nhiều ngày (DTEND/DURATION)
+nằm trong chỉ mục khoảng: sắp theo ngày bắt đầu, kèm mảng ngày kết thúc lớn
+nhất tính đến mỗi vị trí (không giảm) để tìm nhị phân các khoảng giao nhau.
+
+SearchIndex là chỉ mục đảo theo tên sự kiện: mỗi từ (đã bỏ dấu) trỏ tới các
+tên chứa nó, danh sách từ được sắp xếp để tìm theo tiền tố bằng tìm kiếm nhị
+phân; mỗi tên giữ các lần diễn ra đã sắp xếp để tìm lần tiếp theo.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+import re
+
+from .amlich_fuzzy import fold
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Các từ đã bỏ dấu của text: 'Tết Trung Thu' → ['tet', 'trung', 'thu']."""
+    return _WORD.findall(fold(text))
+
+
+class EventIndex:
+    """Chỉ mục bất biến dựng từ records (SEQUENCE, mã băm, ngày bắt đầu, summary, ngày kết thúc)."""
+
+    def __init__(self, events, records):
+        spans = sorted((start, end, summary) for _, _, start, summary, end in records.values() if end > start)
+        by_day = events
+        if spans:
+            # events xếp sự kiện nhiều ngày vào ngày bắt đầu, tách chúng ra khỏi danh sách một ngày
+            by_day = dict(events)
+            for start, _, summary in spans:
+                remaining = list(by_day.get(start, []))
+                if summary in remaining:
+                    remaining.remove(summary)
+                if remaining:
+                    by_day[start] = remaining
+                else:
+                    by_day.pop(start, None)
+        self._by_day = by_day
+        self._days = array('i', sorted(day.toordinal() for day, summaries in by_day.items() if summaries))
+        self._span_starts = array('i', (start.toordinal() for start, _, _ in spans))
+        self._span_ends = array('i', (end.toordinal() for _, end, _ in spans))
+        self._span_summaries = [summary for _, _, summary in spans]
+        self._span_max_ends = array('i')
+        max_end = None
+        for end in self._span_ends:
+            max_end = end if max_end is None else max(max_end, end)
+            self._span_max_ends.append(max_end)
+
+    def _spans_overlapping(self, first, last):
+        """Chỉ số các sự kiện nhiều ngày giao với [first, last] (ordinal)."""
+        hi = bisect_right(self._span_starts, last)
+        # trước lo, mọi sự kiện đều kết thúc trước first
+        lo = bisect_left(self._span_max_ends, first, 0, hi)
+        return [i for i in range(lo, hi) if self._span_ends[i] >= first]
+
+    def on(self, day):
+        """Các sự kiện diễn ra trong ngày day (kể cả sự kiện nhiều ngày)."""
+        single = self._by_day.get(day, [])
+        if not self._span_summaries:
+            return single
+        ordinal = day.toordinal()
+        spans = [self._span_summaries[i] for i in self._spans_overlapping(ordinal, ordinal)]
+        return single + spans if spans else single
+
+    def between(self, start, end, clip=True):
+        """Các (ngày, summary, ngày kết thúc) trong khoảng [start, end], sắp theo ngày.
+
+        Sự kiện nhiều ngày bắt đầu trước start được xếp vào ngày start, trừ khi
+        clip=False (giữ ngày bắt đầu thật, dùng cho lịch).
+        """
+        first, last = start.toordinal(), end.toordinal()
+        result = []
+        for ordinal in self._days[bisect_left(self._days, first):bisect_right(self._days, last)]:
+            day = date.fromordinal(ordinal)
+            result.extend((day, summary, day) for summary in self._by_day[day])
+        if self._span_summaries:
+            spans = self._spans_overlapping(first, last)
+            if spans:
+                floor = first if clip else 0
+                result.extend((date.fromordinal(max(self._span_starts[i], floor)), self._span_summaries[i],
+                               date.fromordinal(self._span_ends[i])) for i in spans)
+                result.sort(key=lambda item: item[0])
+        return result
+
+    def next_from(self, day):
+        """Sự kiện đang diễn ra hoặc sắp tới sớm nhất kể từ day: (ngày bắt đầu, summary, ngày kết thúc), hoặc None."""
+        ordinal = day.toordinal()
+        candidates = []
+        if self._span_summaries:
+            ongoing = self._spans_overlapping(ordinal, ordinal)
+            if ongoing:
+                i = ongoing[0]
+                return (date.fromordinal(self._span_starts[i]), self._span_summaries[i],
+                        date.fromordinal(self._span_ends[i]))
+            i = bisect_right(self._span_starts, ordinal)
+            if i < len(self._span_starts):
+                candidates.append((self._span_starts[i], self._span_summaries[i], self._span_ends[i]))
+        i = bisect_left(self._days, ordinal)
+        if i < len(self._days):
+            single = date.fromordinal(self._days[i])
+            candidates.append((self._days[i], self._by_day[single][0], self._days[i]))
+        if not candidates:
+            return None
+        start, summary, end = min(candidates, key=lambda item: item[0])
+        return date.fromordinal(start), summary, date.fromordinal(end)
+
+
+class SearchIndex:
+    """Chỉ mục toàn văn bất biến dựng từ records, tìm tên sự kiện theo tiền tố các từ."""
+
+    # Nhóm đồng hạng lớn hơn ngưỡng này được xếp theo lần diễn ra bằng cách duyệt
+    # danh sách chung mọi lần diễn ra thay vì tìm nhị phân cho từng tên
+    _SCAN_THRESHOLD = 32
+
+    def __init__(self, records):
+        occurrences = {}
+        for _, _, start, summary, end in records.values():
+            occurrences.setdefault(summary, []).append((start.toordinal(), end.toordinal()))
+        tokens_by_name = {name: tokenize(name) for name in occurrences}
+        # Thứ tự tên là thứ tự xếp hạng khi đồng điểm: ít từ hơn trước, rồi theo chữ cái
+        self._names = sorted(occurrences, key=lambda name: (len(tokens_by_name[name]), name))
+        self._ids = {name: name_id for name_id, name in enumerate(self._names)}
+        self._lengths = array('i')
+        self._starts = []
+        self._ends = []
+        everything = []
+        postings = {}
+        for name_id, name in enumerate(self._names):
+            spans = sorted(occurrences[name])
+            self._starts.append(array('i', (start for start, _ in spans)))
+            self._ends.append(array('i', (end for _, end in spans)))
+            everything.extend((start, name_id) for start, _ in spans)
+            self._lengths.append(len(tokens_by_name[name]))
+            for token in tokens_by_name[name]:
+                postings.setdefault(token, set()).add(name_id)
+        everything.sort()
+        self._all_starts = array('i', (start for start, _ in everything))
+        self._all_ids = array('i', (name_id for _, name_id in everything))
+        self._tokens = sorted(postings)
+        self._postings = [frozenset(postings[token]) for token in self._tokens]
+
+    def __len__(self):
+        return len(self._names)
+
+    def _prefix_range(self, prefix):
+        return bisect_left(self._tokens, prefix), bisect_left(self._tokens, prefix + '\uffff')
+
+    def search(self, query, day=None, limit=5):
+        """Các tên sự kiện chứa mọi từ của query (khớp tiền tố), xếp hạng tốt nhất trước.
+
+        Từ khớp trọn được ưu tiên hơn khớp tiền tố, rồi đến tên ít từ hơn; nếu có
+        day thì tên có lần diễn ra sớm nhất kể từ day đứng trước.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        matches = []
+        for word in words:
+            lo, hi = self._prefix_range(word)
+            if lo == hi:
+                return []
+            matched = self._postings[lo] if hi - lo == 1 else frozenset().union(*self._postings[lo:hi])
+            exact = self._postings[lo] if self._tokens[lo] == word else frozenset()
+            matches.append((matched, exact))
+        matches.sort(key=lambda match: len(match[0]))
+        candidates = matches[0][0].intersection(*(matched for matched, _ in matches[1:]))
+        if not candidates:
+            return []
+        # Số từ chỉ khớp tiền tố của mỗi tên
+        penalty = {}
+        for matched, exact in matches:
+            if len(exact) != len(matched):
+                for name_id in candidates.difference(exact):
+                    penalty[name_id] = penalty.get(name_id, 0) + 1
+        if penalty:
+            ranked = sorted(candidates, key=lambda name_id: (penalty.get(name_id, 0), name_id))
+        else:
+            ranked = sorted(candidates)
+        if day is not None:
+            # Thứ tự tên đã theo số từ nên các tên đồng hạng với tên đầu tiên nằm liền nhau
+            def rank(name_id):
+                return penalty.get(name_id, 0), self._lengths[name_id]
+            size = bisect_right(ranked, rank(ranked[0]), key=rank)
+            ranked[:size] = self._by_next_occurrence(ranked[:size], day.toordinal(), limit)
+        return [self._names[name_id] for name_id in ranked[:limit]]
+
+    def _by_next_occurrence(self, group, ordinal, limit):
+        """Sắp các tên đồng hạng theo lần diễn ra tiếp theo (tên đã hết xếp cuối)."""
+        if len(group) <= self._SCAN_THRESHOLD:
+            return sorted(group, key=lambda name_id: self._next_index(name_id, ordinal)[1])
+        members = set(group)
+        found = []
+        for name_id in self._all_ids[bisect_left(self._all_starts, ordinal):]:
+            if name_id in members:
+                members.discard(name_id)
+                found.append(name_id)
+                if len(found) == limit:
+                    break
+        return found + sorted(members)
+
+    def _next_index(self, name_id, ordinal):
+        """(vị trí, ngày bắt đầu) của lần diễn ra đầu tiên chưa kết thúc trước ordinal."""
+        starts, ends = self._starts[name_id], self._ends[name_id]
+        i = bisect_left(starts, ordinal)
+        if i and ends[i - 1] >= ordinal:
+            i -= 1
+        return i, starts[i] if i < len(starts) else date.max.toordinal()
+
+    def next_occurrence(self, name, day):
+        """(ngày bắt đầu, ngày kết thúc) của lần diễn ra tiếp theo (kể cả đang diễn ra) từ day, None nếu hết."""
+        name_id = self._ids[name]
+        i, _ = self._next_index(name_id, day.toordinal())
+        if i == len(self._starts[name_id]):
+            return None
+        return date.fromordinal(self._starts[name_id][i]), date.fromordinal(self._ends[name_id][i])
+
+    def occurrence_in_year(self, name, year):
+        """(ngày bắt đầu, ngày kết thúc) của lần diễn ra đầu tiên trong năm dương lịch year, None nếu không có."""
+        name_id = self._ids[name]
+        starts = self._starts[name_id]
+        i = bisect_left(starts, date(year, 1, 1).toordinal())
+        if i == len(starts) or starts[i] > date(year, 12, 31).toordinal():
+            return None
+        return date.fromordinal(starts[i]), date.fromordinal(self._ends[name_id][i])
@@ -0,0 +1,279 @@
+"""Bộ chuyển đổi âm lịch - dương lịch Việt Nam tính theo thiên văn.
+
+Thuật toán của Hồ Ngọc Đức: tính thời điểm sóc (trăng mới) và trung khí
+theo kinh tuyến 105°Đ (UTC+7), xác định tháng nhuận là tháng đầu tiên
+không chứa trung khí trong năm có 13 tháng âm lịch.
+"""
+from array import array
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+import math
+
+TIME_ZONE = 7.0
+
+# Chênh lệch giữa số ngày Julius (JDN) và date.toordinal()
+_JD_OFFSET = 1721425
+
+LunarDate = namedtuple('LunarDate', ['day', 'month', 'year', 'leap'])
+
+
+def _jd_from_date(solar_date):
+    return solar_date.toordinal() + _JD_OFFSET
+
+
+def _date_from_jd(jd):
+    return date.fromordinal(jd - _JD_OFFSET)
+
+
+def _new_moon(k):
+    """Thời điểm (ngày Julius) của lần sóc thứ k tính từ 1/1/1900."""
+    T = k / 1236.85
+    T2 = T * T
+    T3 = T2 * T
+    dr = math.pi / 180
+    Jd1 = 2415020.75933 + 29.53058868 * k + 0.0001178 * T2 - 0.000000155 * T3
+    Jd1 += 0.00033 * math.sin((166.56 + 132.87 * T - 0.009173 * T2) * dr)
+    M = 359.2242 + 29.10535608 * k - 0.0000333 * T2 - 0.00000347 * T3
+    Mpr = 306.0253 + 385.81691806 * k + 0.0107306 * T2 + 0.00001236 * T3
+    F = 21.2964 + 390.67050646 * k - 0.0016528 * T2 - 0.00000239 * T3
+    C1 = (0.1734 - 0.000393 * T) * math.sin(M * dr) + 0.0021 * math.sin(2 * dr * M)
+    C1 = C1 - 0.4068 * math.sin(Mpr * dr) + 0.0161 * math.sin(dr * 2 * Mpr)
+    C1 = C1 - 0.0004 * math.sin(dr * 3 * Mpr)
+    C1 = C1 + 0.0104 * math.sin(dr * 2 * F) - 0.0051 * math.sin(dr * (M + Mpr))
+    C1 = C1 - 0.0074 * math.sin(dr * (M - Mpr)) + 0.0004 * math.sin(dr * (2 * F + M))
+    C1 = C1 - 0.0004 * math.sin(dr * (2 * F - M)) - 0.0006 * math.sin(dr * (2 * F + Mpr))
+    C1 = C1 + 0.0010 * math.sin(dr * (2 * F - Mpr)) + 0.0005 * math.sin(dr * (2 * Mpr + M))
+    if T < -11:
+        deltat = 0.001 + 0.000839 * T + 0.0002261 * T2 - 0.00000845 * T3 - 0.000000081 * T * T3
+    else:
+        deltat = -0.000278 + 0.000265 * T + 0.000262 * T2
+    return Jd1 + C1 - deltat
+
+
+def _sun_longitude(jdn):
+    """Kinh độ mặt trời (radian, 0..2π) tại thời điểm jdn (giờ UTC)."""
+    T = (jdn - 2451545.0) / 36525
+    T2 = T * T
+    dr = math.pi / 180
+    M = 357.52910 + 35999.05030 * T - 0.0001559 * T2 - 0.00000048 * T * T2
+    L0 = 280.46645 + 36000.76983 * T + 0.0003032 * T2
+    DL = (1.914600 - 0.004817 * T - 0.000014 * T2) * math.sin(dr * M)
+    DL += (0.019993 - 0.000101 * T) * math.sin(dr * 2 * M) + 0.000290 * math.sin(dr * 3 * M)
+    L = (L0 + DL) * dr
+    return L - math.pi * 2 * math.floor(L / (math.pi * 2))
+
+
+def _new_moon_day(k):
+    return math.floor(_new_moon(k) + 0.5 + TIME_ZONE / 24)
+
+
+def _sun_longitude_sector(day_number):
+    """Chỉ số cung hoàng đạo 30° (0..11) chứa mặt trời lúc nửa đêm đầu ngày."""
+    return math.floor(_sun_longitude(day_number - 0.5 - TIME_ZONE / 24) / math.pi * 6)
+
+
+@lru_cache(maxsize=256)
+def _lunar_month11(year):
+    """Ngày Julius bắt đầu tháng 11 âm lịch (tháng chứa Đông chí) của năm dương lịch year."""
+    off = _jd_from_date(date(year, 12, 31)) - 2415021
+    k = math.floor(off / 29.530588853)
+    nm = _new_moon_day(k)
+    if _sun_longitude_sector(nm) >= 9:
+        nm = _new_moon_day(k - 1)
+    return nm
+
+
+def _leap_month_offset(a11):
+    k = math.floor((a11 - 2415021.076998695) / 29.530588853 + 0.5)
+    i = 1
+    arc = _sun_longitude_sector(_new_moon_day(k + i))
+    last = None
+    while arc != last and i < 14:
+        last = arc
+        i += 1
+        arc = _sun_longitude_sector(_new_moon_day(k + i))
+    return i - 1
+
+
+@lru_cache(maxsize=256)
+def _year_months(year):
+    """Các tháng âm lịch từ tháng 11 năm year-1 đến trước tháng 11 năm year.
+
+    Trả về tuple các (ngày Julius bắt đầu, tháng, năm âm lịch, nhuận) và ngày
+    Julius bắt đầu tháng 11 tiếp theo.
+    """
+    a11 = _lunar_month11(year - 1)
+    b11 = _lunar_month11(year)
+    k = math.floor((a11 - 2415021.076998695) / 29.530588853 + 0.5)
+    leap_offset = _leap_month_offset(a11) if b11 - a11 > 365 else None
+    months = []
+    i = 0
+    while True:
+        start = _new_moon_day(k + i)
+        if start >= b11:
+            break
+        if leap_offset is not None and i >= leap_offset:
+            month = i + 10
+        else:
+            month = i + 11
+        if month > 12:
+            month -= 12
+        lunar_year = year - 1 if month >= 11 and i < 4 else year
+        months.append((start, month, lunar_year, i == leap_offset))
+        i += 1
+    return tuple(months), b11
+
+
+def _months_containing(jd, year):
+    months, b11 = _year_months(year)
+    if jd >= b11:
+        return _year_months(year + 1)
+    if jd < months[0][0]:
+        return _year_months(year - 1)
+    return months, b11
+
+
+def solar_to_lunar(solar_date):
+    """Đổi ngày dương lịch sang LunarDate(day, month, year, leap)."""
+    jd = _jd_from_date(solar_date)
+    months, _ = _months_containing(jd, solar_date.year)
+    index = len(months) - 1
+    while months[index][0] > jd:
+        index -= 1
+    start, month, year, leap = months[index]
+    return LunarDate(jd - start + 1, month, year, leap)
+
+
+def lunar_to_solar(day, month, year, leap=False):
+    """Đổi ngày âm lịch sang ngày dương lịch, trả về None nếu ngày không tồn tại."""
+    if not (1 <= day <= 30 and 1 <= month <= 12):
+        return None
+    months, b11 = _year_months(year + 1 if month >= 11 else year)
+    for index, (start, m, y, is_leap) in enumerate(months):
+        if m == month and y == year and is_leap == bool(leap):
+            end = months[index + 1][0] if index + 1 < len(months) else b11
+            if day > end - start:
+                return None
+            return _date_from_jd(start + day - 1)
+    return None
+
+
+def solar_to_lunar_range(start_date, end_date):
+    """Đổi hàng loạt các ngày từ start_date đến end_date (bao gồm cả hai đầu).
+
+    Chỉ tính thiên văn một lần cho mỗi tháng âm lịch rồi điền tuần tự các ngày,
+    nhanh hơn nhiều so với gọi solar_to_lunar cho từng ngày.
+    """
+    result = []
+    jd = _jd_from_date(start_date)
+    end_jd = _jd_from_date(end_date)
+    year = start_date.year
+    while jd <= end_jd:
+        months, b11 = _months_containing(jd, year)
+        for index, (start, month, lunar_year, leap) in enumerate(months):
+            month_end = months[index + 1][0] if index + 1 < len(months) else b11
+            while jd < month_end and jd <= end_jd:
+                if jd >= start:
+                    result.append(LunarDate(jd - start + 1, month, lunar_year, leap))
+                    jd += 1
+                else:
+                    break
+        year = _date_from_jd(jd).year if jd <= end_jd else year
+    return result
+
+
+def _pack(day, month, year, leap):
+    return (year << 10) | (int(leap) << 9) | (month << 5) | day
+
+
+def _pack_month(month, year, leap):
+    return (year << 5) | (month << 1) | int(leap)
+
+
+class LunarDayTable:
+    """Bảng âm lịch gọn cho các năm dương lịch từ start_year đến end_year.
+
+    Mỗi ngày chiếm một phần tử array('I') đánh chỉ số theo date.toordinal(),
+    gói ngày, tháng, năm âm lịch và cờ nhuận. Các tháng âm lịch được lưu
+    thành hai array song song (mã tháng tăng dần, ordinal ngày mùng 1), kèm
+    dict mã tháng → vị trí để đổi âm lịch sang dương lịch bằng một lần tra.
+    Ngày nằm ngoài bảng được tính trực tiếp bằng thuật toán thiên văn.
+    """
+
+    def __init__(self, start_year, end_year):
+        self.start_year = start_year
+        self.end_year = end_year
+        self._first = date(start_year, 1, 1).toordinal()
+        last = date(end_year, 12, 31).toordinal()
+        self._days = array('I')
+        self._month_keys = array('I')
+        self._month_starts = array('i')
+        ordinal = self._first
+        year = start_year
+        while ordinal <= last:
+            months, b11 = _year_months(year)
+            for index, (start, month, lunar_year, leap) in enumerate(months):
+                start -= _JD_OFFSET
+                end = (months[index + 1][0] if index + 1 < len(months) else b11) - _JD_OFFSET
+                self._month_keys.append(_pack_month(month, lunar_year, leap))
+                self._month_starts.append(start)
+                while ordinal < end and ordinal <= last:
+                    if ordinal >= start:
+                        self._days.append(_pack(ordinal - start + 1, month, lunar_year, leap))
+                    ordinal += 1
+            year += 1
+        # Mốc kết thúc của tháng cuối cùng để tính độ dài tháng
+        self._month_starts.append(b11 - _JD_OFFSET)
+        self._index_months()
+
+    @classmethod
+    def from_buffers(cls, start_year, end_year, days, month_keys, month_starts):
+        """Tạo bảng từ các buffer đã lưu (array hoặc memoryview), không tính lại."""
+        table = cls.__new__(cls)
+        table.start_year = start_year
+        table.end_year = end_year
+        table._first = date(start_year, 1, 1).toordinal()
+        table._days = days
+        table._month_keys = month_keys
+        table._month_starts = month_starts
+        table._index_months()
+        return table
+
+    def _index_months(self):
+        # (năm âm lịch, tháng, nhuận) đã gói → vị trí trong _month_keys/_month_starts
+        self._month_index = {key: index for index, key in enumerate(self._month_keys)}
+
+    def buffers(self):
+        return self._days, self._month_keys, self._month_starts
+
+    def __len__(self):
+        return len(self._days)
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self._days, self._month_keys, self._month_starts))
+
+    def lunar(self, solar_date):
+        """Ngày âm lịch của solar_date, dạng LunarDate."""
+        offset = solar_date.toordinal() - self._first
+        if not 0 <= offset < len(self._days):
+            return solar_to_lunar(solar_date)
+        value = self._days[offset]
+        return LunarDate(value & 0x1F, (value >> 5) & 0xF, value >> 10, bool(value & 0x200))
+
+    def solar(self, day, month, year, leap=False):
+        """Ngày dương lịch của ngày âm lịch, None nếu ngày không tồn tại."""
+        if not (1 <= day <= 30 and 1 <= month <= 12):
+            return None
+        key = _pack_month(month, year, leap)
+        index = self._month_index.get(key)
+        if index is None:
+            if self._month_keys and self._month_keys[0] < key < self._month_keys[-1]:
+                # Trong phạm vi bảng nhưng không có tháng này (tháng nhuận không tồn tại)
+                return None
+            return lunar_to_solar(day, month, year, leap)
+        start = self._month_starts[index]
+        if day > self._month_starts[index + 1] - start:
+            return None
+        return date.fromordinal(start + day - 1)
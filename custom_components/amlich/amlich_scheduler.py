@@ -0,0 +1,113 @@
+"""Điều phối truy vấn cho một sensor: chờ người dùng gõ xong, gộp truy vấn
+trùng và hủy truy vấn đã cũ để chỉ kết quả mới nhất được ghi ra.
+
+Mỗi lần input thay đổi, truy vấn được hẹn chạy sau một khoảng chờ ngắn; thay
+đổi mới trong lúc chờ thay thế truy vấn cũ (bị bỏ). Truy vấn giống hệt truy vấn
+đang chờ hoặc đang chạy được gộp vào, truy vấn khác thì hủy truy vấn đang chạy.
+"""
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .amlich_cache import normalize_key
+
+_LOGGER = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = 0.4
+
+
+class QueryScheduler:
+    """Chạy run(query, use_humor) theo kiểu 'mới nhất thắng', gửi kết quả cho on_result."""
+
+    def __init__(self, hass: HomeAssistant, run, on_result, debounce=DEBOUNCE_SECONDS, name="amlich_query"):
+        self._hass = hass
+        self._run = run
+        self._on_result = on_result
+        self._debounce = debounce
+        self._name = name
+        # Truy vấn đang chờ hết khoảng debounce: (khóa, query, use_humor) và hàm hủy hẹn giờ
+        self._pending = None
+        self._cancel_timer = None
+        # Truy vấn đang chạy: khóa và task
+        self._running_key = None
+        self._task = None
+        self.submitted = 0
+        self.merged = 0
+        self.dropped = 0
+        self.completed = 0
+
+    @callback
+    def submit(self, query, use_humor=False, delay=None):
+        """Hẹn chạy query; truy vấn trùng được gộp, truy vấn cũ hơn bị bỏ hoặc hủy."""
+        self.submitted += 1
+        key = (normalize_key(query), use_humor)
+        if self._pending is not None and self._pending[0] == key:
+            self.merged += 1
+            return
+        if self._pending is None and self._task is not None and self._running_key == key:
+            self.merged += 1
+            return
+        if self._pending is not None:
+            _LOGGER.debug("Bỏ truy vấn đang chờ: %s", self._pending[1])
+            self._cancel_timer()
+            self._pending = self._cancel_timer = None
+            self.dropped += 1
+        self._pending = (key, query, use_humor)
+        self._cancel_timer = async_call_later(
+            self._hass, self._debounce if delay is None else delay, self._start_pending
+        )
+
+    @callback
+    def _start_pending(self, _now):
+        key, query, use_humor = self._pending
+        self._pending = self._cancel_timer = None
+        if self._task is not None:
+            if self._running_key == key:
+                # Truy vấn mới giống truy vấn đang chạy, chờ kết quả đó
+                self.merged += 1
+                return
+            _LOGGER.debug("Hủy truy vấn đang chạy đã cũ: %s", self._running_key[0])
+            self._task.cancel()
+            self.dropped += 1
+        self._running_key = key
+        self._task = self._hass.async_create_task(self._execute(key, query, use_humor), self._name)
+
+    async def _execute(self, key, query, use_humor):
+        task = asyncio.current_task()
+        try:
+            result = await self._run(query, use_humor)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _LOGGER.error("Lỗi khi xử lý truy vấn '%s': %s", query, e)
+            result = {"output": f"Lỗi xử lý: {str(e)}"}
+        finally:
+            current = self._task is task
+            if current:
+                self._task = self._running_key = None
+        self.completed += 1
+        if not current or (self._pending is not None and self._pending[0] != key):
+            # Đã có truy vấn khác mới hơn, kết quả này đã cũ
+            self.dropped += 1
+            return
+        self._on_result(result)
+
+    @callback
+    def cancel(self):
+        """Hủy truy vấn đang chờ và đang chạy (khi sensor bị gỡ)."""
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+        self._pending = self._cancel_timer = None
+        if self._task is not None:
+            self._task.cancel()
+        self._task = self._running_key = None
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'merged': self.merged,
+            'dropped': self.dropped,
+            'completed': self.completed
+        }
@@ -0,0 +1,66 @@
+"""Thống kê độ trễ truy vấn theo từng giai đoạn và đường xử lý.
+
+Mỗi giai đoạn giữ thời gian của WINDOW lần gần nhất (cửa sổ trượt), các
+phân vị p50/p95/p99 chỉ được tính khi đọc thống kê nên việc ghi rất rẻ.
+"""
+from collections import Counter, deque
+
+WINDOW = 500
+
+
+class RollingPercentiles:
+    """Các giá trị gần nhất (tối đa window) và phân vị của chúng."""
+
+    def __init__(self, window=WINDOW):
+        self._values = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value):
+        self._values.append(value)
+        self.count += 1
+
+    def summary(self, scale=1000):
+        """{'count', 'p50', 'p95', 'p99', 'max'} (mặc định đổi giây sang ms), phân vị theo hạng gần nhất."""
+        if not self._values:
+            return {'count': self.count}
+        values = sorted(self._values)
+        last = len(values) - 1
+
+        def percentile(p):
+            return round(values[min(last, int(p / 100 * len(values)))] * scale, 3)
+
+        return {
+            'count': self.count,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': round(values[-1] * scale, 3)
+        }
+
+
+class QueryStats:
+    """Độ trễ tổng, độ trễ từng giai đoạn và số truy vấn theo đường xử lý."""
+
+    def __init__(self, window=WINDOW):
+        self._window = window
+        self.total = RollingPercentiles(window)
+        self.stages = {}
+        self.paths = Counter()
+
+    def record(self, stages, total, path):
+        """Ghi một truy vấn: stages là dict giai đoạn → số giây."""
+        self.total.add(total)
+        self.paths[path or 'unknown'] += 1
+        for stage, seconds in stages.items():
+            rolling = self.stages.get(stage)
+            if rolling is None:
+                rolling = self.stages[stage] = RollingPercentiles(self._window)
+            rolling.add(seconds)
+
+    def summary(self):
+        return {
+            'queries': self.total.count,
+            'paths': dict(self.paths),
+            'total_ms': self.total.summary(),
+            'stages_ms': {stage: rolling.summary() for stage, rolling in self.stages.items()}
+        }
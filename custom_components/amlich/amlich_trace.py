@@ -0,0 +1,74 @@
+"""Ghi vết thời gian từng giai đoạn xử lý (tải ICS, phân tích truy vấn...).
+
+start_trace() trả về NULL_TRACE khi logger không bật DEBUG và không cần ghi
+thống kê: các phương thức của nó không làm gì nên chỗ gọi không phải tự kiểm
+tra mức log. Khi có stats (QueryStats), thời gian luôn được đo và ghi vào đó,
+còn dòng DEBUG chỉ được tạo khi DEBUG bật.
+"""
+import logging
+from time import perf_counter
+
+
+class _NullTrace:
+    """Trace rỗng, dùng khi DEBUG tắt và không cần ghi thống kê."""
+
+    __slots__ = ()
+    enabled = False
+
+    def mark(self, stage):
+        pass
+
+    def resolved(self, path):
+        pass
+
+    def finish(self, outcome=None):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Trace:
+    """Đo thời gian các giai đoạn liên tiếp của một thao tác, ghi một dòng DEBUG khi kết thúc."""
+
+    enabled = True
+
+    def __init__(self, logger, operation, subject=None, stats=None):
+        self._logger = logger
+        self._operation = operation
+        self._subject = subject
+        self._stats = stats
+        self._started = self._last = perf_counter()
+        # giai đoạn → số giây theo thứ tự thực hiện, giai đoạn lặp lại được cộng dồn
+        self.stages = {}
+        # Đường xử lý cuối cùng (ví dụ 'local', 'gemini'), ghi vào thống kê
+        self.path = None
+
+    def mark(self, stage):
+        """Kết thúc giai đoạn stage, tính từ lần mark trước (hoặc lúc bắt đầu)."""
+        now = perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self._last
+        self._last = now
+
+    def resolved(self, path):
+        """Ghi nhận đường xử lý; gọi nhiều lần thì lần cuối được giữ."""
+        self.path = path
+
+    def finish(self, outcome=None):
+        total = perf_counter() - self._started
+        if self._stats is not None:
+            self._stats.record(self.stages, total, self.path)
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        outcome = outcome or self.path
+        stages = ', '.join(f"{stage} {seconds * 1000:.3f}" for stage, seconds in self.stages.items())
+        self._logger.debug("%s%s: %.3f ms [%s]%s", self._operation,
+                           f" '{self._subject}'" if self._subject is not None else '',
+                           total * 1000, stages, f" → {outcome}" if outcome else '')
+
+
+def start_trace(logger, operation, subject=None, stats=None):
+    """Trace mới nếu cần ghi thống kê hoặc logger đang bật DEBUG, ngược lại NULL_TRACE."""
+    if stats is not None or logger.isEnabledFor(logging.DEBUG):
+        return Trace(logger, operation, subject, stats)
+    return NULL_TRACE
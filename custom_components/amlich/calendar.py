@@ -0,0 +1,78 @@
+from datetime import timedelta
+from homeassistant.components.calendar import CalendarEntity, CalendarEvent
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.util import dt as dt_util
+from .amlich_core import get_calendar_data, get_lunar_date
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "amlich"
+
+async def async_setup_platform(hass: HomeAssistant, config, async_add_entities: AddEntitiesCallback, discovery_info=None):
+    """Thiết lập lịch sự kiện."""
+    _LOGGER.debug("Bắt đầu khởi tạo calendar.am_lich")
+    async_add_entities([AmlichCalendar()])
+
+class AmlichCalendar(CalendarEntity):
+    """Lịch các sự kiện trong file ICS, mỗi sự kiện kèm ngày âm lịch.
+
+    Sự kiện được lấy thẳng từ chỉ mục đã sắp xếp (EventIndex) nên không đọc lại
+    ICS hay duyệt từng ngày. CalendarEvent kiểm tra schema khi tạo nên được nhớ
+    lại theo từng lần diễn ra, bỏ đi khi dữ liệu ICS được tải lại.
+    """
+
+    _attr_name = "Âm Lịch"
+    _attr_unique_id = "amlich_calendar"
+    _attr_icon = "mdi:calendar-star"
+
+    def __init__(self):
+        self._data = None
+        self._memo = {}
+
+    async def async_added_to_hass(self):
+        @callback
+        def ics_reloaded(event):
+            self.async_write_ha_state()
+
+        self.async_on_remove(self.hass.bus.async_listen(f"{DOMAIN}_ics_reloaded", ics_reloaded))
+
+    def _calendar_data(self):
+        data = get_calendar_data()
+        if data is not self._data:
+            self._data = data
+            self._memo = {}
+        return data
+
+    def _lunar_text(self, day, data):
+        lunar = get_lunar_date(day, data.day_table)
+        text = f"{lunar.day:02d}/{lunar.month:02d}/{lunar.year}"
+        return f"{text} (nhuận)" if lunar.leap else text
+
+    def _event(self, start, summary, end, data):
+        key = (start, summary, end)
+        event = self._memo.get(key)
+        if event is None:
+            description = f"Âm lịch: {self._lunar_text(start, data)}"
+            if end > start:
+                description += f" - {self._lunar_text(end, data)}"
+            # Ngày kết thúc của sự kiện cả ngày trong HA không tính vào sự kiện
+            event = self._memo[key] = CalendarEvent(start=start, end=end + timedelta(days=1), summary=summary,
+                                                    description=description)
+        return event
+
+    @property
+    def event(self):
+        data = self._calendar_data()
+        upcoming = data.index.next_from(dt_util.now().date())
+        return self._event(*upcoming, data) if upcoming else None
+
+    async def async_get_events(self, hass: HomeAssistant, start_date, end_date):
+        data = self._calendar_data()
+        first = dt_util.as_local(start_date).date()
+        # end_date không thuộc khoảng: nửa đêm ngày D nghĩa là đến hết ngày D-1
+        last = dt_util.as_local(end_date - timedelta(microseconds=1)).date()
+        if last < first:
+            return []
+        return [self._event(start, summary, end, data) for start, summary, end in data.index.between(first, last, clip=False)]
@@ -0,0 +1,107 @@
+"""Intent tra cứu âm lịch/sự kiện cho trợ lý hội thoại của Home Assistant.
+
+Intent AmlichQuery gọi thẳng query_date và trả lời bằng câu nói, không qua
+input_text, sensor hay automation. Các mẫu câu (giống automation hướng dẫn
+trong README) được đăng ký với agent hội thoại mặc định khi nó sẵn sàng.
+"""
+import inspect
+import logging
+
+import voluptuous as vol
+
+from homeassistant.const import EVENT_COMPONENT_LOADED
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv, intent
+
+from .amlich_core import query_date
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "amlich"
+INTENT_QUERY = "AmlichQuery"
+
+# Tiền tố câu tra cứu → mẫu câu; phần {query} được ghép sau tiền tố
+_SENTENCES = {
+    'Âm lịch': ["{prefix} (âm lịch|am lich) {query}", "(âm lịch|am lich) {query}"],
+    'Dương lịch': ["{prefix} (dương lịch|duong lich) {query}", "(dương lịch|duong lich) {query}"],
+    'Sự kiện': ["{prefix} (sự kiện|su kien) {query}", "(sự kiện|su kien) {query}"],
+}
+# Câu hỏi ngày của sự kiện theo tên, cả câu được tra cứu nguyên văn
+_QUESTION_SENTENCES = [
+    "(khi nào|khi nao|bao giờ|bao gio) {query}",
+    "{query} (khi nào|khi nao|bao giờ|bao gio|vào ngày nào|vao ngay nao|ngày nào|ngay nao)",
+]
+
+
+async def async_answer(hass: HomeAssistant, query):
+    """Câu trả lời cho query, theo công tắc input_boolean.use_humor."""
+    use_humor = hass.states.is_state("input_boolean.use_humor", "on")
+    result = await query_date(hass, query, use_humor=use_humor)
+    return result.get("output", "Không có dữ liệu sự kiện, vui lòng thử lại!")
+
+
+async def async_setup_intents(hass: HomeAssistant):
+    """Đăng ký intent (được component intent gọi)."""
+    intent.async_register(hass, QueryIntentHandler())
+
+
+class QueryIntentHandler(intent.IntentHandler):
+    """Tra cứu âm lịch, dương lịch, sự kiện từ slot query."""
+
+    intent_type = INTENT_QUERY
+    slot_schema = {vol.Required('query'): cv.string}
+
+    async def async_handle(self, intent_obj: intent.Intent):
+        slots = self.async_validate_slots(intent_obj.slots)
+        response = intent_obj.create_response()
+        response.async_set_speech(await async_answer(intent_obj.hass, slots['query']['value']))
+        return response
+
+
+@callback
+def async_register_sentences(hass: HomeAssistant):
+    """Đăng ký mẫu câu với agent hội thoại mặc định, chờ component conversation nếu chưa tải."""
+    if "conversation" in hass.config.components:
+        hass.async_create_task(_async_register_sentences(hass))
+        return
+
+    @callback
+    def component_loaded(event):
+        if event.data.get("component") == "conversation":
+            unsub()
+            hass.async_create_task(_async_register_sentences(hass))
+
+    unsub = hass.bus.async_listen(EVENT_COMPONENT_LOADED, component_loaded)
+
+
+async def _async_register_sentences(hass: HomeAssistant):
+    try:
+        # Home Assistant chưa có API công khai để integration thêm mẫu câu, nên dùng đúng đường
+        # mà trigger conversation của HA dùng (_get_agent_manager, register_trigger; kiểm tra
+        # với HA 2024.3). Nếu phiên bản khác đổi API thì chỉ bỏ qua mẫu câu, intent vẫn dùng được.
+        from homeassistant.components.conversation import HOME_ASSISTANT_AGENT, _get_agent_manager
+        agent = await _get_agent_manager(hass).async_get_agent(HOME_ASSISTANT_AGENT)
+        register = agent.register_trigger
+        inspect.signature(register).bind([], _sentence_callback(hass, None))
+    except (ImportError, AttributeError, ValueError, TypeError) as e:
+        _LOGGER.warning("Không thể đăng ký mẫu câu hội thoại: %s", e)
+        return
+    for prefix, sentences in _SENTENCES.items():
+        register(sentences, _sentence_callback(hass, prefix))
+    register(_QUESTION_SENTENCES, _sentence_callback(hass, None))
+    _LOGGER.debug("Đã đăng ký mẫu câu hội thoại cho intent %s", INTENT_QUERY)
+
+
+def _sentence_callback(hass: HomeAssistant, prefix):
+    async def answer(user_input, result):
+        # HA 2024.3 truyền câu nói (str), các bản sau truyền ConversationInput có thuộc tính text
+        sentence = getattr(user_input, 'text', user_input)
+        query = sentence
+        if prefix is not None:
+            query = f"{prefix} {result.entities['query'].value.strip()}"
+        response = await intent.async_handle(
+            hass, DOMAIN, INTENT_QUERY, {'query': {'value': query}}, text_input=sentence
+        )
+        return response.speech.get('plain', {}).get('speech')
+
+    return answer
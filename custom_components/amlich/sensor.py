@@ -1,32 +1,59 @@
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.core import HomeAssistant, callback
+from datetime import timedelta
+import voluptuous as vol
+from homeassistant.components.sensor import PLATFORM_SCHEMA, SensorEntity, SensorStateClass
+from homeassistant.core import HomeAssistant, callback, split_entity_id
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.event import async_track_state_change_event
-from homeassistant.const import STATE_UNKNOWN
-from .amlich_core import query_date
+from homeassistant.const import CONF_NAME, STATE_UNKNOWN, UnitOfTime
+from .amlich_core import get_diagnostics, query_date
+from .amlich_scheduler import QueryScheduler
 import logging
 
 _LOGGER = logging.getLogger(__name__)
 
 DOMAIN = "amlich"
 INPUT_TEXT_ENTITY = "input_text.tracuu"
+HUMOR_ENTITY = "input_boolean.use_humor"
+# Chu kỳ cập nhật của sensor chẩn đoán (sensor tra cứu không poll)
+SCAN_INTERVAL = timedelta(seconds=30)
+
+CONF_CHANNELS = "channels"
+CONF_INPUT = "input"
+CONF_HUMOR = "humor"
+
+# Mỗi kênh tra cứu là một cặp input_text → sensor với bộ điều phối riêng, mọi kênh
+# dùng chung dữ liệu lịch và client Gemini. Mặc định một kênh input_text.tracuu.
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
+    vol.Optional(CONF_CHANNELS, default=[{CONF_INPUT: INPUT_TEXT_ENTITY}]): vol.All(cv.ensure_list, [vol.Schema({
+        vol.Required(CONF_INPUT): cv.entity_domain("input_text"),
+        vol.Optional(CONF_NAME): cv.string,
+        vol.Optional(CONF_HUMOR, default=HUMOR_ENTITY): cv.entity_domain("input_boolean"),
+    })]),
+})
 
 async def async_setup_platform(hass: HomeAssistant, config, async_add_entities: AddEntitiesCallback, discovery_info=None):
     """Thiết lập sensor."""
-    _LOGGER.debug("Bắt đầu khởi tạo sensor.tra_cuu_su_kien")
+    channels = config[CONF_CHANNELS]
+    _LOGGER.debug("Bắt đầu khởi tạo %s kênh tra cứu", len(channels))
     try:
-        sensor = AmlichSensor(hass)
-        async_add_entities([sensor])
-        _LOGGER.info("Đã thêm sensor.tra_cuu_su_kien vào Home Assistant")
+        sensors = [AmlichSensor(hass, channel[CONF_INPUT], channel.get(CONF_NAME), channel.get(CONF_HUMOR, HUMOR_ENTITY))
+                   for channel in channels]
+        async_add_entities([*sensors, AmlichDiagnosticsSensor()])
+        _LOGGER.info("Đã thêm %s sensor tra cứu vào Home Assistant", len(sensors))
     except Exception as e:
-        _LOGGER.error(f"Lỗi khi khởi tạo sensor.tra_cuu_su_kien: {str(e)}")
+        _LOGGER.error("Lỗi khi khởi tạo sensor tra cứu: %s", e)
         raise
 
 class AmlichSensor(SensorEntity):
     """Sensor tra cứu sự kiện."""
 
-    def __init__(self, hass: HomeAssistant):
+    def __init__(self, hass: HomeAssistant, input_entity=INPUT_TEXT_ENTITY, name=None, humor_entity=HUMOR_ENTITY):
         self._hass = hass
+        self._input_entity = input_entity
+        self._humor_entity = humor_entity
+        self._query = None
         self._state = "Không có dữ liệu"
         self._attributes = {
             "output": "Không có dữ liệu",
@@ -34,14 +61,44 @@ class AmlichSensor(SensorEntity):
             "lunar_date": None,  # Lưu ngày âm lịch dạng DD/MM/YYYY
             "events": []
         }
-        self._attr_name = "Tra Cứu Sự Kiện"
-        self._attr_unique_id = f"{DOMAIN}_su_kien_sensor"
+        object_id = split_entity_id(input_entity)[1]
+        if input_entity == INPUT_TEXT_ENTITY:
+            # Kênh mặc định giữ tên và unique_id cũ (sensor.tra_cuu_su_kien)
+            self._attr_name = name or "Tra Cứu Sự Kiện"
+            self._attr_unique_id = f"{DOMAIN}_su_kien_sensor"
+        else:
+            self._attr_name = name or f"Tra Cứu Sự Kiện {object_id}"
+            self._attr_unique_id = f"{DOMAIN}_su_kien_sensor_{object_id}"
         self._attr_should_poll = False
+        # Gõ nhanh hoặc lệnh thoại lặp lại chỉ chạy truy vấn mới nhất; mỗi kênh một bộ
+        # điều phối nên truy vấn của kênh này không hủy hay ghi đè kết quả kênh khác
+        self._scheduler = QueryScheduler(hass, self._run_query, self._apply_result, name=f"amlich_query_{object_id}")
         _LOGGER.debug("Đã khởi tạo instance AmlichSensor")
 
+    def _use_humor(self):
+        # Đọc trạng thái công tắc hài hước của kênh (mặc định input_boolean.use_humor)
+        use_humor_state = self._hass.states.get(self._humor_entity)
+        return use_humor_state.state == "on" if use_humor_state else False
+
+    async def _run_query(self, query, use_humor):
+        return await query_date(self._hass, query, use_humor=use_humor)
+
+    @callback
+    def _apply_result(self, result):
+        self._attributes = {
+            "output": result.get("output", "Không có dữ liệu"),
+            "date": result.get("date"),
+            "range": result.get("range"),
+            "is_lunar": result.get("is_lunar", False),
+            "lunar_date": result.get("lunar_date"),  # Đảm bảo chứa năm (DD/MM/YYYY)
+            "events": result.get("events", [])
+        }
+        self._state = result.get("output", "Không có dữ liệu")[:255]
+        self.async_write_ha_state()
+
     async def async_added_to_hass(self):
         """Gọi khi sensor được thêm vào Home Assistant."""
-        _LOGGER.debug("Gọi async_added_to_hass cho sensor.tra_cuu_su_kien")
+        _LOGGER.debug("Gọi async_added_to_hass cho %s", self.entity_id)
         try:
             @callback
             def input_text_changed(event):
@@ -50,46 +107,30 @@ class AmlichSensor(SensorEntity):
                     return
                 query = new_state.state.strip()
                 if query:
-                    _LOGGER.debug(f"Xử lý truy vấn: {query}")
-                    async def handle_query():
-                        # Đọc trạng thái input_boolean.use_humor
-                        use_humor = self._hass.states.get("input_boolean.use_humor").state == "on" if self._hass.states.get("input_boolean.use_humor") else False
-                        result = await query_date(self._hass, query, use_humor=use_humor)
-                        self._attributes = {
-                            "output": result.get("output", "Không có dữ liệu"),
-                            "date": result.get("date"),
-                            "range": result.get("range"),
-                            "is_lunar": result.get("is_lunar", False),
-                            "lunar_date": result.get("lunar_date"),  # Đảm bảo chứa năm (DD/MM/YYYY)
-                            "events": result.get("events", [])
-                        }
-                        self._state = result.get("output", "Không có dữ liệu")[:255]
-                        self.async_write_ha_state()
-                    self._hass.async_create_task(handle_query())
-
-            async_track_state_change_event(
-                self._hass, [INPUT_TEXT_ENTITY], input_text_changed
-            )
-            _LOGGER.debug(f"Đã đăng ký lắng nghe {INPUT_TEXT_ENTITY}")
-
-            input_state = self._hass.states.get(INPUT_TEXT_ENTITY)
+                    _LOGGER.debug("Xử lý truy vấn (%s): %s", self._input_entity, query)
+                    self._query = query
+                    self._scheduler.submit(query, self._use_humor())
+
+            @callback
+            def ics_reloaded(event):
+                # Dữ liệu lịch đã đổi, tra lại truy vấn hiện tại của kênh
+                if self._query:
+                    self._scheduler.submit(self._query, self._use_humor(), delay=0)
+
+            self.async_on_remove(async_track_state_change_event(
+                self._hass, [self._input_entity], input_text_changed
+            ))
+            self.async_on_remove(self._hass.bus.async_listen(f"{DOMAIN}_ics_reloaded", ics_reloaded))
+            self.async_on_remove(self._scheduler.cancel)
+            _LOGGER.debug("Đã đăng ký lắng nghe %s", self._input_entity)
+
+            input_state = self._hass.states.get(self._input_entity)
             if input_state and input_state.state and input_state.state != STATE_UNKNOWN:
-                # Đọc trạng thái input_boolean.use_humor
-                use_humor = self._hass.states.get("input_boolean.use_humor").state == "on" if self._hass.states.get("input_boolean.use_humor") else False
-                result = await query_date(self._hass, input_state.state.strip(), use_humor=use_humor)
-                self._attributes = {
-                    "output": result.get("output", "Không có dữ liệu"),
-                    "date": result.get("date"),
-                    "range": result.get("range"),
-                    "is_lunar": result.get("is_lunar", False),
-                    "lunar_date": result.get("lunar_date"),  # Đảm bảo chứa năm (DD/MM/YYYY)
-                    "events": result.get("events", [])
-                }
-                self._state = result.get("output", "Không có dữ liệu")[:255]
-                self.async_write_ha_state()
-                _LOGGER.debug("Đã cập nhật state ban đầu cho sensor.tra_cuu_su_kien")
+                self._query = input_state.state.strip()
+                self._scheduler.submit(self._query, self._use_humor(), delay=0)
+                _LOGGER.debug("Đã gửi truy vấn ban đầu cho %s", self.entity_id)
         except Exception as e:
-            _LOGGER.error(f"Lỗi trong async_added_to_hass: {str(e)}")
+            _LOGGER.error("Lỗi trong async_added_to_hass: %s", e)
 
     @property
     def state(self):
@@ -97,4 +138,30 @@ class AmlichSensor(SensorEntity):
 
     @property
     def extra_state_attributes(self):
-        return self._attributes
+        stats = self._scheduler.stats()
+        return {
+            **self._attributes,
+            "input_entity": self._input_entity,
+            "merged_queries": stats['merged'],
+            "dropped_queries": stats['dropped']
+        }
+
+class AmlichDiagnosticsSensor(SensorEntity):
+    """Sensor chẩn đoán: p95 độ trễ truy vấn, chi tiết từng giai đoạn và số lần gọi Gemini/cache trong thuộc tính."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    # Thống kê lồng nhau đổi sau mỗi lần cập nhật, không ghi vào recorder (chỉ ghi state p95)
+    _unrecorded_attributes = frozenset({'calendar', 'queries', 'gemini', 'cache'})
+
+    def __init__(self):
+        self._attr_name = "Độ Trễ Tra Cứu"
+        self._attr_unique_id = f"{DOMAIN}_query_latency_sensor"
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+
+    async def async_update(self):
+        diagnostics = get_diagnostics()
+        self._attr_native_value = diagnostics['queries']['total_ms'].get('p95')
+        self._attr_extra_state_attributes = diagnostics
@@ -0,0 +1,5 @@
+"""Cấu hình chung cho test: import custom_components.amlich từ thư mục gốc của repo."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,81 @@
+"""Import nặng không nằm trên đường tra cứu và không chạy trên event loop.
+
+Mỗi test chạy trong một tiến trình Python mới để sys.modules chưa có sẵn các
+module của component.
+"""
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import textwrap
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).parent / "fixtures"
+# Chỉ cần khi đọc ICS/snapshot hoặc gọi Gemini
+HEAVY_MODULES = (
+    "icalendar",
+    "dateutil.parser",
+    "mmap",
+    "custom_components.amlich.amlich_ics",
+    "homeassistant.helpers.aiohttp_client",
+)
+
+
+def _run(code, cwd):
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], cwd=cwd,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_core_import_is_light():
+    loaded = _run(f"""
+        import sys
+        import custom_components.amlich.amlich_core
+        import custom_components.amlich.sensor
+        print(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+        """, ROOT)
+    assert loaded == "[]"
+
+
+def test_setup_does_not_import_on_event_loop(tmp_path):
+    (tmp_path / "custom_components").mkdir()
+    (tmp_path / "custom_components" / "amlich").symlink_to(ROOT / "custom_components" / "amlich")
+    shutil.copy(FIXTURES / "amlich.ics", tmp_path / "amlich.ics")
+    on_loop = _run(f"""
+        import asyncio, sys, threading
+        from types import SimpleNamespace
+
+        from homeassistant import bootstrap, config_entries, core, loader
+        from homeassistant.setup import async_setup_component
+
+        WATCHED = {HEAVY_MODULES + ("custom_components.amlich.amlich_core",)!r}
+        on_loop = []
+
+        class Watcher:
+            def find_spec(self, name, path=None, target=None):
+                if name in WATCHED and threading.current_thread() is threading.main_thread():
+                    on_loop.append(name)
+                return None
+
+        async def main():
+            hass = core.HomeAssistant({str(tmp_path)!r})
+            loader.async_setup(hass)
+            hass.config_entries = config_entries.ConfigEntries(hass, {{}})
+            await bootstrap.async_load_base_functionality(hass)
+            hass.http = SimpleNamespace(register_view=lambda view: None)
+            hass.config.components.add("http")
+            sys.meta_path.insert(0, Watcher())
+            assert await async_setup_component(hass, "amlich", {{"amlich": {{
+                "path": {str(tmp_path / "amlich.ics")!r}, "api_key": "test"}}}})
+            assert await async_setup_component(hass, "sensor", {{"sensor": [{{"platform": "amlich"}}]}})
+            await hass.async_block_till_done()
+            from custom_components.amlich.amlich_core import get_gemini_client, query_date
+            await query_date(hass, "âm lịch 15/8/2026", use_humor=False)
+            get_gemini_client(hass)
+            await hass.async_stop(force=True)
+
+        asyncio.run(main())
+        print(sorted(set(on_loop)))
+        """, tmp_path)
+    assert on_loop == "[]"
@@ -0,0 +1,84 @@
+"""Đối chiếu bộ chuyển đổi âm lịch với các ngày đã biết và giữa các cách tính với nhau."""
+from datetime import date, timedelta
+from pathlib import Path
+import re
+
+import pytest
+
+from custom_components.amlich.amlich_ics import iter_events
+from custom_components.amlich.amlich_lunar import (
+    LunarDayTable, lunar_to_solar, solar_to_lunar, solar_to_lunar_range
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+# Định dạng ngày âm lịch của file amlich.ics cũ: "DD/MM", tháng nhuận có "(N)"
+_LUNAR_SUMMARY = re.compile(r'^(\d{1,2})/(\d{1,2})(\s*\(N\))?$')
+
+
+@pytest.fixture(scope="module")
+def table():
+    return LunarDayTable(1900, 2100)
+
+
+def _reference():
+    for event in iter_events(str(FIXTURES / "lunar_reference.ics")):
+        day, month, leap = _LUNAR_SUMMARY.match(event.summary).groups()
+        yield event.start, int(day), int(month), leap is not None
+
+
+def test_reference_dates(table):
+    reference = list(_reference())
+    assert reference
+    for solar, day, month, leap in reference:
+        lunar = solar_to_lunar(solar)
+        assert (lunar.day, lunar.month, lunar.leap) == (day, month, leap), solar
+        assert table.lunar(solar) == lunar
+        assert lunar_to_solar(day, month, lunar.year, leap) == solar
+        assert table.solar(day, month, lunar.year, leap) == solar
+
+
+def test_table_matches_direct_computation(table):
+    # Một ngày mỗi tuần, lệch pha để phủ mọi thứ trong tuần và mọi vị trí trong tháng âm lịch
+    day = date(1900, 1, 1)
+    while day.year <= 2100:
+        assert table.lunar(day) == solar_to_lunar(day), day
+        day += timedelta(days=9)
+
+
+def test_table_round_trip(table):
+    day = date(1900, 1, 1)
+    end = date(2100, 12, 31)
+    while day <= end:
+        lunar = table.lunar(day)
+        assert table.solar(lunar.day, lunar.month, lunar.year, lunar.leap) == day, day
+        day += timedelta(days=1)
+
+
+def test_range_matches_single_conversion():
+    start, end = date(2019, 11, 1), date(2021, 3, 31)
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    assert solar_to_lunar_range(start, end) == [solar_to_lunar(day) for day in days]
+
+
+def test_missing_dates(table):
+    # Năm 2025 nhuận tháng 6 (không nhuận tháng 5); tháng 1/2025 âm lịch có 30 ngày, tháng 2 chỉ có 29
+    assert table.solar(1, 6, 2025, leap=True) == date(2025, 7, 25)
+    assert table.solar(1, 5, 2025, leap=True) is None
+    assert table.solar(30, 1, 2025) == date(2025, 2, 27)
+    assert table.solar(30, 2, 2025) is None
+    assert lunar_to_solar(30, 2, 2025) is None
+    assert table.solar(0, 1, 2025) is None
+    assert table.solar(1, 13, 2025) is None
+
+
+def test_outside_table_falls_back():
+    table = LunarDayTable(2020, 2021)
+    assert table.lunar(date(1985, 1, 21)) == solar_to_lunar(date(1985, 1, 21))
+    assert table.solar(1, 1, 2007) == date(2007, 2, 17)
+
+
+def test_from_buffers(table):
+    copy = LunarDayTable.from_buffers(table.start_year, table.end_year, *table.buffers())
+    for solar, day, month, leap in _reference():
+        assert copy.lunar(solar) == table.lunar(solar)
+        assert copy.solar(day, month, solar_to_lunar(solar).year, leap) == solar
@@ -0,0 +1,75 @@
+"""So kết quả parse_input trên tập câu tra cứu mẫu với kết quả đã lưu (golden).
+
+Ngày hiện tại được cố định ở GOLDEN_TODAY và không có Gemini API key, nên câu
+không phân tích tại chỗ được sẽ trả lỗi 'Không có Gemini API key'. Sau khi
+thay đổi hành vi có chủ đích, tạo lại file golden bằng:
+
+    python tests/test_parse_golden.py --update
+"""
+import asyncio
+from datetime import datetime
+import json
+from pathlib import Path
+import shutil
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from custom_components.amlich import amlich_core as core
+
+FIXTURES = Path(__file__).parent / "fixtures"
+GOLDEN_PATH = FIXTURES / "parse_golden.json"
+GOLDEN_TODAY = datetime(2025, 5, 15, 9, 0)
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return GOLDEN_TODAY.replace(tzinfo=tz) if tz else GOLDEN_TODAY
+
+
+def _parse_all(queries, ics_dir):
+    """Kết quả parse_input của từng câu; lỗi ngoại lệ được ghi lại thành {'exception': ...}."""
+    ics_path = Path(ics_dir) / "amlich.ics"
+    shutil.copy(FIXTURES / "amlich.ics", ics_path)
+    saved = core.datetime, core.GEMINI_API_KEY
+    core.datetime, core.GEMINI_API_KEY = _FrozenDatetime, None
+    try:
+        assert core.load_ics_file(str(ics_path))
+
+        async def run():
+            results = {}
+            for query in queries:
+                try:
+                    results[query] = await core.parse_input(None, query)
+                except Exception as e:
+                    results[query] = {'exception': f"{type(e).__name__}: {e}"}
+            return results
+
+        return asyncio.run(run())
+    finally:
+        core.datetime, core.GEMINI_API_KEY = saved
+
+
+def _load_golden():
+    return json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))
+
+
+def test_parse_matches_golden(tmp_path):
+    golden = _load_golden()
+    results = _parse_all(list(golden), tmp_path)
+    mismatches = {query: (expected, results[query]) for query, expected in golden.items()
+                  if results[query] != expected}
+    assert not mismatches, f"{len(mismatches)}/{len(golden)} câu khác golden, ví dụ: {next(iter(mismatches.items()))}"
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--update"]:
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as ics_dir:
+        results = _parse_all(_load_golden(), ics_dir)
+    lines = [f"{json.dumps(query, ensure_ascii=False)}: {json.dumps(result, ensure_ascii=False, sort_keys=True)}"
+             for query, result in sorted(results.items())]
+    GOLDEN_PATH.write_text("{\n" + ",\n".join(lines) + "\n}\n", encoding="utf-8")
+    print(f"Đã ghi {len(results)} câu vào {GOLDEN_PATH}")
@@ -0,0 +1,96 @@
+"""Tra cứu liên tục trong khi file ICS được tải lại ở luồng khác (executor)."""
+import asyncio
+from datetime import date
+from pathlib import Path
+import shutil
+import threading
+
+import pytest
+
+from custom_components.amlich import amlich_core as core
+
+FIXTURES = Path(__file__).parent / "fixtures"
+QUERIES = ("sự kiện 20/10/2026", "dương lịch 20/10/2026", "âm lịch 15/8/2026", "khi nào tết trung thu")
+EXTRA_EVENTS = """BEGIN:VEVENT
+UID:extra-1
+DTSTART;VALUE=DATE:20261020
+DTEND;VALUE=DATE:20261021
+SUMMARY:Họp lớp
+END:VEVENT
+BEGIN:VEVENT
+UID:extra-2
+DTSTART;VALUE=DATE:20261019
+DTEND;VALUE=DATE:20261022
+SUMMARY:Du lịch Đà Lạt
+END:VEVENT
+END:VCALENDAR"""
+
+
+@pytest.fixture
+def ics_files(tmp_path):
+    """Hai phiên bản file ICS: bản mẫu và bản có thêm hai sự kiện ngày 20/10/2026."""
+    first = tmp_path / "a" / "amlich.ics"
+    second = tmp_path / "b" / "amlich.ics"
+    for path in (first, second):
+        path.parent.mkdir()
+        shutil.copy(FIXTURES / "amlich.ics", path)
+    content = second.read_text(encoding="utf-8")
+    second.write_text(content.replace("END:VCALENDAR", EXTRA_EVENTS), encoding="utf-8")
+    return str(first), str(second)
+
+
+def test_queries_during_reloads(ics_files):
+    assert core.load_ics_file(ics_files[0])
+    stop = threading.Event()
+    reloads = 0
+    errors = []
+
+    def reloader():
+        nonlocal reloads
+        try:
+            while not stop.is_set():
+                path = ics_files[reloads % 2]
+                # Xen kẽ tải lại từng phần (reload_ics_file) và tải mới toàn bộ (load_ics_file)
+                if reloads % 3:
+                    assert core.reload_ics_file(path) is not None
+                else:
+                    assert core.load_ics_file(path)
+                reloads += 1
+        except Exception as e:
+            errors.append(e)
+
+    async def run_queries():
+        counts = set()
+        for _ in range(750):
+            for query in QUERIES:
+                result = await core.query_date(None, query, use_humor=False)
+                output = result.get('output', '')
+                assert 'Không có dữ liệu' not in output and 'Lỗi' not in output, (query, output)
+                if query == QUERIES[0]:
+                    counts.add(tuple(sorted(result['events'])))
+            await asyncio.sleep(0)
+        return counts
+
+    thread = threading.Thread(target=reloader)
+    thread.start()
+    try:
+        counts = asyncio.run(run_queries())
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors
+    assert reloads > 0
+    # Mỗi truy vấn thấy trọn vẹn một trong hai phiên bản, không bao giờ là trạng thái dở dang
+    assert counts <= {
+        ("Ngày Phụ nữ Việt Nam",),
+        ("Du lịch Đà Lạt", "Họp lớp", "Ngày Phụ nữ Việt Nam"),
+    }
+
+
+def test_reload_reports_changes(ics_files):
+    assert core.load_ics_file(ics_files[0])
+    changes = core.reload_ics_file(ics_files[1])
+    assert {summary for _, _, _, summary, _ in changes['added']} == {"Họp lớp", "Du lịch Đà Lạt"}
+    assert not changes.get('removed')
+    day = date(2026, 10, 21)
+    assert [summary for _, summary, _ in core.get_calendar_data().index.between(day, day)] == ["Du lịch Đà Lạt"]
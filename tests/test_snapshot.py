@@ -0,0 +1,69 @@
+"""Snapshot cạnh file ICS: đọc lại đúng dữ liệu và không thực thi nội dung lạ."""
+from datetime import date
+import os
+from pathlib import Path
+import pickle
+import shutil
+
+import pytest
+
+from custom_components.amlich import amlich_core as core
+from custom_components.amlich import amlich_ics
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+class _Marker:
+    """Khi được unpickle sẽ tạo file đánh dấu."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return open, (self.path, "w")
+
+
+@pytest.fixture
+def ics_path(tmp_path):
+    path = tmp_path / "amlich.ics"
+    shutil.copy(FIXTURES / "amlich.ics", path)
+    return str(path)
+
+
+def _load(ics_path):
+    key = amlich_ics.file_key(ics_path)
+    return amlich_ics.load_snapshot(ics_path, key, core.DAY_TABLE_START_YEAR, core.DAY_TABLE_END_YEAR)
+
+
+def test_snapshot_round_trip(ics_path):
+    core.load_ics_file(ics_path)
+    parsed = core._data
+    assert os.path.exists(amlich_ics.snapshot_path(ics_path))
+    payload, table = _load(ics_path)
+    assert payload["records"] == parsed.records
+    assert payload["events"] == parsed.events
+    assert list(payload["events"]) == list(parsed.events)
+    assert bytes(table.buffers()[0]) == bytes(parsed.day_table.buffers()[0])
+
+
+def test_snapshot_is_data_only(ics_path, tmp_path, monkeypatch):
+    core.load_ics_file(ics_path)
+    marker = tmp_path / "executed"
+    _, table = _load(ics_path)
+    # Giả một snapshot có khóa hợp lệ nhưng phần sự kiện là pickle độc hại
+    monkeypatch.setattr(amlich_ics, "_encode_payload", lambda payload: pickle.dumps(_Marker(str(marker))))
+    assert amlich_ics.save_snapshot(ics_path, amlich_ics.file_key(ics_path), {}, table)
+    monkeypatch.undo()
+    assert _load(ics_path) is None
+    assert not marker.exists()
+    # Snapshot hỏng thì phân tích lại file ICS và ghi snapshot mới
+    core.load_ics_file(ics_path)
+    assert _load(ics_path) is not None
+    assert core._data.events[date(2026, 10, 20)] == ["Ngày Phụ nữ Việt Nam"]
+
+
+def test_snapshot_of_other_owner_is_ignored(ics_path, monkeypatch):
+    core.load_ics_file(ics_path)
+    assert _load(ics_path) is not None
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(ics_path).st_uid + 1, raising=False)
+    assert _load(ics_path) is None